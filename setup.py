@@ -27,7 +27,8 @@ setup(
   zip_safe         = False,
   classifiers      = CLASSIFIERS.splitlines(),
   package_dir      = {'' : 'src'},
-  install_requires = ['robotframework', 'requests'],
+  install_requires = ['robotframework>=2.8.5', 'requests'],
   packages         = ['IOSLibrary'],
-  package_data     = {'IOSLibrary': ['resources/*']}
+  package_data     = {'IOSLibrary': ['resources/gestures.bundle',
+                                    'resources/*.applescript']}
 )
@@ -1,19 +1,44 @@
-import requests
+import httplib
 import logging
+import socket
 import subprocess
 import json
 import os
 import robot
 import time
+import random
+import hashlib
+import tempfile
+import re
 from robot.variables import GLOBAL_VARIABLES
 from robot.api import logger
+from robot.libraries.BuiltIn import BuiltIn
 from urlparse import urljoin
-
-THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-execfile(os.path.join(THIS_DIR, 'version.py'))
+from IOSLibrary.cache import ExpiringCache
+from IOSLibrary.codec import IncrementalResponse, get_codec
+from IOSLibrary.elements import StringTable, compact_results
+from IOSLibrary.launcher import (PROBE_TIMEOUT, SimulatorLauncher,
+                                 SimulatorSupervisor)
+from IOSLibrary.gestures import GestureStore, play_request
+from IOSLibrary.pipeline import post_pipelined
+from IOSLibrary.pool import DevicePool, ENV_SHARD, device_from_environment
+from IOSLibrary.listener import LibraryListener
+from IOSLibrary.metrics import Metrics
+from IOSLibrary.trace import Tracer
+from IOSLibrary.search import find_all
+from IOSLibrary.synthesis import (GestureSynthesizer, pinch_paths,
+                                  swipe_paths)
+from IOSLibrary.utils import is_truthy
+from IOSLibrary.snapshot import Snapshot, UnsupportedQuery, like_regex
+from IOSLibrary.screenshots import ScreenshotStore, ScreenshotWriter
+
+from IOSLibrary.version import VERSION
 
 __version__ = VERSION
 
+GESTURES = GestureStore()
+SYNTHESIZER = GestureSynthesizer()
+
 ORIENTATIONS = {
     "down": 0,
     "right": 90,
@@ -28,9 +53,31 @@ ORIENTATIONS_REV = {
     270: "left"
 }
 
+JSON_HEADERS = {
+    'Content-Type': 'application/json;charset=utf-8'
+}
+
+# map operations which don't change the screen
+READONLY_METHODS = ("query", "query_all")
+
+ROTATION_POLL_INTERVAL = 0.05
+
+SCREENSHOT_CHUNK_SIZE = 64 * 1024
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+# poll intervals of the wait keywords, in seconds
+WAIT_INITIAL_INTERVAL = 0.1
+WAIT_MAX_INTERVAL = 2
+
+# time given to simulators kept for reuse to quit at the end of the run
+SIMULATOR_STOP_TIMEOUT = 30
+
 DEFAULT_SIMULATOR = ("/Applications/Xcode.app/Contents/Applications/" +
                      "iPhone Simulator.app/Contents/MacOS/iPhone Simulator")
 
+# waxsim executables found so far, per $PATH
+_WAXSIM = {}
+
 
 class IOSLibraryException(Exception):
     pass
@@ -41,25 +88,77 @@ class IOSLibrary(object):
     ROBOT_LIBRARY_VERSION = VERSION
     ROBOT_LIBRARY_SCOPE = 'GLOBAL'
 
-    def __init__(self, device_endpoint='localhost:37265'):
+    def __init__(self, device_endpoint='localhost:37265', pool_size=10,
+                 timeout=None, json_codec=None, compact_results=False,
+                 playback_speed=1):
         """
         Initialize the IOSLibrary.
 
         `device_endpoint` endpoint of the test server (the instrumented app).
         Optional if you are running tests on the local machine against the
         simulator.
+
+        `pool_size` maximum number of keep-alive connections kept open to the
+        test server.
+
+        `timeout` default timeout for every request sent to the test server,
+        e.g. "30 seconds". Waits forever if omitted.
+
+        `json_codec` json implementation to use, "json", "simplejson" or
+        "ujson". Defaults to the fastest one installed.
+
+        `compact_results` if true, `Query` and `Query All` return compact,
+        lazily decoded elements instead of dicts, see
+        `Use Compact Results`.
+
+        `playback_speed` how much faster recorded gestures are played, see
+        `Set Playback Speed`.
         """
+        self._username = None
+        self._password = None
+        self._session = None
+        self._pool_size = int(pool_size)
+        self._workers = None
+        self._query_cache = None
+        self._snapshot = None
+        self._snapshot_ttl = None
+        self.set_webview_cache_timeout()
+        self._snapshot_hits = 0
+        self._snapshot_misses = 0
+        self._screenshot_writer = None
+        self._screenshot_store = None
+        self._metrics = Metrics()
+        self._performance_stats_file = None
+        self._trace_dir = None
+        self._rotation_timeout = 1
+        self._gesture_batch = None
+        self.set_playback_speed(playback_speed)
+        self.ROBOT_LIBRARY_LISTENER = LibraryListener(self)
+        self._timeout = self._timestr_to_secs(timeout)
+        self._codec = get_codec(json_codec)
+        self._strings = StringTable()
+        self.use_compact_results(compact_results)
+        self._device_pool = None
+        self._leased_device = None
+        self._url = None
         if device_endpoint:
             self.set_device_url('http://%s/' % device_endpoint)
         self._screenshot_index = 0
+        self._screenshot_prefix = ''
         self._current_orientation = 0
-        self._waxsim = self._find_waxsim()
-        self._username = None
-        self._password = None
-        if os.path.exists(DEFAULT_SIMULATOR):
-            self.set_simulator(DEFAULT_SIMULATOR)
+        self._simulator = DEFAULT_SIMULATOR
+        self._launcher = None
+        self._simulator_supervisor = None
+        self._warm_simulators = None
+        self._simulator_reset = None
         self._device = "iPhone"
         self._ios_major_version = 5
+        pinned = device_from_environment()
+        if pinned:
+            # started by IOSLibrary.runner on a leased device
+            self._use_device(pinned)
+            self._screenshot_prefix = 'shard%s-' % os.environ.get(
+                ENV_SHARD, '')
 
     def set_device_url(self, url):
         """
@@ -68,6 +167,7 @@ class IOSLibrary(object):
         `url` the base url to use for all requests
         """
         self._url = url
+        self._reset_session()
 
     def set_basic_auth(self, username, password):
         '''
@@ -79,15 +179,53 @@ class IOSLibrary(object):
         '''
         self._username = username
         self._password = password
+        self._reset_session()
+
+    def set_request_timeout(self, timeout=None):
+        """
+        Set the timeout for all further requests to the test server.
+
+        `timeout` e.g. "30 seconds" or "1 minute". Waits forever if omitted.
+        """
+        self._timeout = self._timestr_to_secs(timeout)
+
+    def _timestr_to_secs(self, timeout):
+        if timeout is None or timeout == '':
+            return None
+        return robot.utils.timestr_to_secs(timeout)
+
+    def _reset_session(self):
+        # one keep-alive connection pool per device endpoint, rebuilt whenever
+        # the endpoint or the credentials change
+        if self._session is not None:
+            self._session.close()
+        self._session = None
+
+    def _http(self):
+        # requests is imported on first use, so libdoc and dry runs don't
+        # pay for it
+        if self._session is None:
+            import requests
+            import requests.adapters
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self._pool_size)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            if self._username is not None:
+                self._session.auth = (self._username, self._password)
+        return self._session
 
     def _find_waxsim(self):
-        path = os.environ['PATH']
-        for d in path.split(os.pathsep):
-            if os.path.exists(d):
-                files = os.listdir(d)
-                if 'waxsim' in files:
-                    return os.path.join(d, 'waxsim')
-        return None
+        path = os.environ.get('PATH', '')
+        if path not in _WAXSIM:
+            _WAXSIM[path] = None
+            for d in path.split(os.pathsep):
+                candidate = os.path.join(d, 'waxsim')
+                if d and os.path.isfile(candidate):
+                    _WAXSIM[path] = candidate
+                    break
+        return _WAXSIM[path]
 
     def set_simulator(self, simulator_path=DEFAULT_SIMULATOR):
         """
@@ -124,59 +262,210 @@ class IOSLibrary(object):
         values are: 4, 5, 6, must be a number.
         """
 
-        assert type(ios_version) is int, "%s is not a number, but should be." % (device_name, allowed)
+        try:
+            ios_major_version = int(ios_major_version)
+        except ValueError:
+            raise AssertionError("%s is not a number, but should be." %
+                                 ios_major_version)
 
         self._ios_major_version = ios_major_version
 
-    def _get_app_and_binary(self, app_path):
-        filename, ext = os.path.splitext(app_path)
-        binary = None
-        if ext == '.app':
-            binary = os.path.join(app_path, filename)
-        elif ext == '':
-            app_path = os.path.dirname(app_path)
-            binary = filename
-        return app_path, binary
+    def set_device_pool(self, pool_file):
+        """
+        Set the pool of devices used by `Lease Device`.
 
-    def _check_simulator(self):
-        assert (os.path.exists(self._simulator) or
-                (self._waxsim and os.path.exists(self._waxsim))), (
-                "neither simulator at %s nor waxsim could be found"
-                % self._simulator)
+        `pool_file` json file listing the devices, e.g.
+        [{"endpoint": "localhost:37265", "device": "iPhone", "ios_version": 6}]
+        """
+        self._device_pool = DevicePool.from_file(pool_file)
 
-    def start_simulator(self, app_path, sdk='5.1'):
+    def lease_device(self, timeout="1 minute"):
         """
-        Starts the App found at `app_path` in the iOS Simulator.
+        Lease a free and healthy device from the device pool and send all
+        further commands to it. Device and iOS version are set as well.
+
+        The device stays leased, also for other robot processes, until
+        `Release Device` is called.
+
+        `timeout` maximum time to wait for a device to become free
+
+        Example:
+        | Set Device Pool | devices.json |
+        | Lease Device    |              |
+        | Touch           | button       |
+        | Release Device  |              |
+        """
+        assert self._device_pool, "Set Device Pool has to be called first"
+        if self._leased_device:
+            self.release_device()
+        try:
+            device = self._device_pool.lease(
+                    robot.utils.timestr_to_secs(timeout))
+        except RuntimeError as e:
+            raise IOSLibraryException(str(e))
+        self._leased_device = device
+        self._use_device(device)
+        logger.info("Leased %r" % device)
+
+    def release_device(self):
+        """
+        Return the device leased by `Lease Device` to the pool.
+        """
+        if self._leased_device:
+            self._device_pool.release(self._leased_device)
+            self._leased_device = None
+
+    def _use_device(self, device):
+        self.set_device_url(device.url)
+        self.set_device(device.device)
+        self.set_ios_version(device.ios_version)
+
+    def set_simulator_launcher(self, launcher, *args, **kwargs):
+        """
+        Set how `Start Simulator` and `Stop Simulator` run the app.
+
+        `launcher` name of a launcher class, see `IOSLibrary.launcher`,
+        instantiated with the remaining arguments. By default the iOS
+        Simulator set with `Set Simulator` is used, through waxsim if found.
+
+        `IOSLibrary.launcher.FakeLauncher` serves a stand-in for the app
+        instead, which makes the simulator keywords testable on any
+        machine.
+
+        Example:
+        | Set Simulator Launcher | IOSLibrary.launcher.FakeLauncher | port=37265 | boot_delay=2 |
+        """
+        if isinstance(launcher, basestring):
+            launcher = robot.utils.Importer('launcher').import_class_or_module(
+                    launcher)
+            launcher = launcher(*args, **kwargs)
+        self._launcher = launcher
+
+    def _supervisor(self):
+        supervisor = self._simulator_supervisor
+        # a running simulator is stopped by the launcher which started it
+        if supervisor is None or not supervisor.is_running():
+            launcher = self._launcher or SimulatorLauncher(
+                    self._simulator, self._find_waxsim())
+            supervisor = SimulatorSupervisor(launcher, self._device_ready)
+            self._simulator_supervisor = supervisor
+        return supervisor
+
+    def _check_device_url(self):
+        if self._url is None:
+            raise IOSLibraryException(
+                    "No device url to wait for the app on, set one with "
+                    "`Set Device Url`")
+
+    def _device_ready(self, timeout):
+        self._check_device_url()
+        return self._device_available(timeout=timeout)
+
+    def start_simulator(self, app_path, sdk='5.1', timeout="1 minute"):
+        """
+        Starts the App found at `app_path` in the iOS Simulator and waits
+        until it is available for receiving commands.
 
         `app_path` Path to the binary of the App to start.
+
+        `timeout` maximum time for the App to become available, the
+        simulator is killed if it doesn't. With 0 returns right after
+        launching the simulator.
         """
-        self._check_simulator()
-        app_path = os.path.expanduser(app_path)
-        assert os.path.exists(app_path), \
-                "Couldn't find app bundle or binary at %s" % app_path
-
-        cmd = []
-        app_path, binary = self._get_app_and_binary(app_path)
-        if not self._waxsim:
-
-            assert binary, "Could not parse app binary name"
-            assert os.path.exists(binary), \
-                "Could not find app binary at %s" % app_path
-            logging.warning("Waxsim not found, execute app without installing it in simulator")
-            cmd = [self._simulator,
-                  '-SimulateDevice',
-                  self._device,
-                  '-SimulateApplication',
-                  binary]
-        else:
-            cmd = [self._waxsim,
-                   '-s',
-                   sdk,
-                   '-f',
-                   self._device.lower(),
-                   app_path]
-        with open("waxsim.log", "w") as logfile:
-            self._simulator_proc = subprocess.Popen(cmd, stderr=logfile)
+        timeout = self._timestr_to_secs(timeout)
+        if timeout:
+            self._check_device_url()
+        key = None
+        if self._warm_simulators is not None:
+            key = (os.path.abspath(os.path.expanduser(app_path)), str(sdk),
+                   self._device, self._url)
+            if self._reuse_simulator(key):
+                return
+            # a simulator answering on the same url is in the way
+            for other in self._warm_simulators.keys():
+                if other[3] == key[3]:
+                    self._stop_supervisor(self._warm_simulators.pop(other),
+                                          SIMULATOR_STOP_TIMEOUT)
+            if self._simulator_supervisor in self._warm_simulators.values():
+                # keep it running for later suites, start another one
+                self._simulator_supervisor = None
+        supervisor = self._supervisor()
+        if supervisor.is_running():
+            self.stop_simulator()
+        self._reset_session()
+        with self._metrics.timer('simulator', 'start'):
+            try:
+                supervisor.start(app_path, sdk, self._device, timeout)
+            except RuntimeError as e:
+                raise IOSLibraryException(str(e))
+        if supervisor.boot_time is not None:
+            logger.info("Simulator ready after %.2f seconds (%d probes)" %
+                        (supervisor.boot_time, supervisor.probes))
+        if key is not None:
+            self._warm_simulators[key] = supervisor
+
+    def _reuse_simulator(self, key):
+        supervisor = self._warm_simulators.pop(key, None)
+        if supervisor is None:
+            return False
+        self._simulator_supervisor = supervisor
+        self._reset_session()
+        if not (supervisor.is_running() and
+                self._device_ready(PROBE_TIMEOUT)):
+            logger.info("Simulator of %s is not healthy, starting a new one"
+                        % key[0])
+            supervisor.kill()
+            return False
+        self._warm_simulators[key] = supervisor
+        logger.info("Reusing the running simulator of %s" % key[0])
+        if self._simulator_reset:
+            BuiltIn().run_keyword(self._simulator_reset)
+        return True
+
+    def enable_simulator_reuse(self, reset=None):
+        """
+        Keep simulators running after `Stop Simulator` and reuse them.
+
+        `Start Simulator` hands out the simulator already running the same
+        app with the same sdk and device at the same device url, if it is
+        still healthy, instead of booting a new one. The simulators are
+        stopped by `Disable Simulator Reuse`, or at the end of the run by the
+        library listener, which requires Robot Framework 2.8.5 or later.
+
+        `reset` keyword run whenever a running simulator is reused, to
+        bring the app back to its initial state, e.g. `Reset Simulator` or
+        a keyword of the test suite.
+
+        Example:
+        | Enable Simulator Reuse | reset=Go To Start Screen |
+        | Start Simulator        | LPSimpleExample.app      |
+        """
+        if self._warm_simulators is None:
+            self._warm_simulators = {}
+        self._simulator_reset = reset
+
+    def disable_simulator_reuse(self):
+        """
+        Stop all simulators kept running by `Enable Simulator Reuse`.
+        """
+        self._stop_warm_simulators()
+        self._warm_simulators = None
+        self._simulator_reset = None
+
+    def _stop_warm_simulators(self):
+        if not self._warm_simulators:
+            return
+        for supervisor in self._warm_simulators.values():
+            self._stop_supervisor(supervisor, SIMULATOR_STOP_TIMEOUT)
+        self._warm_simulators.clear()
+        self._reset_session()
+
+    def _stop_supervisor(self, supervisor, timeout):
+        with self._metrics.timer('simulator', 'stop'):
+            stopped = supervisor.stop(timeout)
+        if not stopped:
+            logger.warn("Simulator didn't quit within %s and was killed"
+                        % robot.utils.secs_to_timestr(timeout))
 
     def reset_simulator(self):
         """
@@ -190,147 +479,521 @@ class IOSLibrary(object):
             with open("reset_sim.err.log","w") as errfile:
                 self._reset = subprocess.Popen(cmd, stdout=logfile, stderr=errfile)
 
-    def stop_simulator(self):
+    def stop_simulator(self, timeout="30 seconds"):
         """
         Stops a previously started iOS Simulator.
-        """
-        cmd = "`echo 'application \"iPhone Simulator\" quit' | osascript`"
-        stop_proc = subprocess.Popen(cmd, shell=True)
-        stop_proc.wait()
-        self._simulator_proc.wait()
 
-    def set_basic_auth(self, username, password):
-        '''
-        Set basic authentication to use with all further API calls
-
-        username is the username to authenticate with, e.g. 'Aladdin'
+        `timeout` maximum time for the simulator to quit, it is killed
+        afterwards.
 
-        password is the password to use, e.g. 'open sesame'
-        '''
-        self._username = username
-        self._password = password
+        Does nothing if the simulator is kept for reuse, see `Enable
+        Simulator Reuse`.
+        """
+        timeout = robot.utils.timestr_to_secs(timeout)
+        supervisor = self._supervisor()
+        if (self._warm_simulators is not None and
+                supervisor in self._warm_simulators.values()):
+            logger.info("Simulator kept running for reuse")
+            return
+        self._stop_supervisor(supervisor, timeout)
+        self._reset_session()
 
     def is_device_available(self):
         """
         Succeeds if the test server is available for receiving commands.
 
-        This is best used with the `Wait Until Keyword Succeeds` keyword from
-        the BuiltIn library like this:
-
-        Example:
-        | Wait Until Keyword Succeeds | 1 minute | 10 seconds | Is device available |
+        To wait for the device to become available use `Wait For Device`.
         """
+        assert self._device_available(raise_errors=True), (
+                "Device is not available")
+
+    def _device_available(self, raise_errors=False, timeout=None):
+        from requests import RequestException
         logger = logging.getLogger()
         previous_loglevel = logger.getEffectiveLevel()
         logger.setLevel(logging.ERROR)
-        status_code = 0
+        kwargs = timeout is not None and {'timeout': timeout} or {}
         try:
-            resp = self._get('version')
-            status_code = resp.status_code
-        except:
-            raise
+            return self._get('version', **kwargs).status_code == 200
+        except (RequestException, AssertionError):
+            if raise_errors:
+                raise
+            return False
         finally:
             logger.setLevel(previous_loglevel)
-        assert status_code == 200, "Device is not available"
+
+    def _wait_until(self, condition, timeout, description):
+        """
+        Polls `condition` until it returns True or `timeout` expires.
+
+        The poll interval starts small and doubles after every poll, with
+        random jitter, so short waits return quickly and long waits don't
+        hammer the test server.
+        """
+        timeout = robot.utils.timestr_to_secs(timeout)
+        start = time.time()
+        deadline = start + timeout
+        interval = WAIT_INITIAL_INTERVAL
+        polls = 0
+        while True:
+            polls += 1
+            if condition():
+                logger.info("Waited %.2f seconds for %s (%d polls)" %
+                            (time.time() - start, description, polls))
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IOSLibraryException(
+                        "Timeout after %s waiting for %s (%d polls)" % (
+                        robot.utils.secs_to_timestr(timeout), description,
+                        polls))
+            time.sleep(min(remaining, random.uniform(interval / 2, interval)))
+            interval = min(interval * 2, WAIT_MAX_INTERVAL)
+
+    def wait_for_device(self, timeout="1 minute"):
+        """
+        Waits until the test server is available for receiving commands.
+
+        `timeout` maximum time to wait, e.g. "30 seconds"
+
+        Example:
+        | Start Simulator | LPSimpleExample.app |
+        | Wait For Device | 1 minute            |
+        """
+        # a booting app may accept connections without answering, every
+        # probe has to end by the deadline
+        deadline = time.time() + robot.utils.timestr_to_secs(timeout)
+
+        def available():
+            remaining = deadline - time.time()
+            return self._device_available(
+                    timeout=max(min(remaining, PROBE_TIMEOUT), 0.01))
+        self._wait_until(available, timeout, "device to become available")
+
+    def wait_until_element_exists(self, query, timeout="10 seconds"):
+        """
+        Waits until an element matching `query` is on the screen.
+
+        `query` query selector. The available syntax is documented here https://github.com/calabash/calabash-ios/wiki/05-Query-syntax
+
+        `timeout` maximum time to wait, e.g. "30 seconds"
+        """
+        self._wait_until(lambda: self._element_exists(query), timeout,
+                         "element '%s' to appear" % query)
+
+    def wait_until_element_is_gone(self, query, timeout="10 seconds"):
+        """
+        Waits until no element matching `query` is on the screen.
+
+        `query` query selector. The available syntax is documented here https://github.com/calabash/calabash-ios/wiki/05-Query-syntax
+
+        `timeout` maximum time to wait, e.g. "30 seconds"
+        """
+        self._wait_until(lambda: not self._element_exists(query), timeout,
+                         "element '%s' to disappear" % query)
+
+    def wait_until_screen_contains_text(self, expected, timeout="10 seconds"):
+        """
+        Waits until the current screen contains a given text
+
+        `expected` The text that should appear on the screen
+
+        `timeout` maximum time to wait, e.g. "30 seconds"
+        """
+        query = self._text_query(expected)
+        self._wait_until(lambda: self._element_exists(query), timeout,
+                         "text '%s' to appear" % expected)
+
+    def _screen_fingerprint(self, query):
+        sha1 = hashlib.sha1()
+        # bypasses the query cache, the screen is expected to change
+        for view in self._map_iter(query, "query_all"):
+            if not isinstance(view, dict):
+                sha1.update(repr(view))
+                continue
+            frame = view.get("frame") or {}
+            sha1.update(repr((view.get("class"), frame.get("x"),
+                              frame.get("y"), frame.get("width"),
+                              frame.get("height"), view.get("label"),
+                              view.get("text"))))
+        return sha1.digest()
+
+    def wait_until_screen_is_stable(self, timeout="10 seconds",
+                                    interval="200 milliseconds", count=3,
+                                    query="view"):
+        """
+        Waits until the view hierarchy stops changing, e.g. after animations.
+
+        The classes, frames, labels and texts of all views are fetched every
+        `interval`, the screen is stable once `count` consecutive fetches
+        are identical.
+
+        `timeout` maximum time to wait, e.g. "30 seconds"
+
+        `interval` time between two fetches of the view hierarchy
+
+        `count` number of identical consecutive fetches needed
+
+        `query` views to compare. Defaults to all views.
+        """
+        timeout = robot.utils.timestr_to_secs(timeout)
+        interval = robot.utils.timestr_to_secs(interval)
+        count = int(count)
+        start = time.time()
+        deadline = start + timeout
+        previous = None
+        matches = 0
+        polls = 0
+        while True:
+            polls += 1
+            fingerprint = self._screen_fingerprint(query)
+            if fingerprint == previous:
+                matches += 1
+            else:
+                previous = fingerprint
+                matches = 1
+            if matches >= count:
+                logger.info("Screen stable after %.2f seconds (%d polls)" %
+                            (time.time() - start, polls))
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IOSLibraryException(
+                        "Timeout after %s waiting for the screen to become "
+                        "stable (%d polls)" % (
+                        robot.utils.secs_to_timestr(timeout), polls))
+            time.sleep(min(remaining, interval))
 
     def _post(self, endp, request, **kwargs):
-        if self._username != None and self._username != None:
-            kwargs['auth'] = (self._username, self._password)
+        kwargs.setdefault('timeout', self._timeout)
         url = urljoin(self._url, endp)
-        res = requests.post(url, data=request, headers={
-          'Content-Type': 'application/json;charset=utf-8'
-        }, **kwargs)
+        with self._metrics.timer('post', endp, url=url) as timer:
+            res = self._http().post(url, data=request, headers=JSON_HEADERS,
+                                     **kwargs)
+            timer.sent = len(request)
+            if kwargs.get('stream'):
+                timer.received = int(res.headers.get('content-length', 0))
+            else:
+                timer.received = len(res.content)
 
         return res
 
     def _get(self, endp, **kwargs):
-        if self._username != None and self._username != None:
-            kwargs['auth'] = (self._username, self._password)
-        res = requests.get(urljoin(self._url, endp), **kwargs)
+        kwargs.setdefault('timeout', self._timeout)
+        url = urljoin(self._url, endp)
+        with self._metrics.timer('get', endp, url=url) as timer:
+            res = self._http().get(url, **kwargs)
+            timer.received = int(res.headers.get('content-length', 0))
         assert res.status_code == 200, (
                 "Device sent http status code %d" % res.status_code)
         return res
 
     def _map(self, query, method_name, args=None):
+        with self._metrics.timer('map', method_name):
+            return self._map_cached(query, method_name, args)
+
+    def _map_cached(self, query, method_name, args=None):
         if args is None:
             args = []
-        data = json.dumps({
+        if method_name not in READONLY_METHODS:
+            self._screen_changed()
+            return self._map_uncached(query, method_name, args)
+        fetch = self._map_uncached
+        if self._compact_results:
+            fetch = self._map_compact
+        if self._query_cache is not None:
+            key = (query, method_name, tuple(args))
+            results = self._query_cache.get(key)
+            if results is None:
+                results = fetch(query, method_name, args)
+                self._query_cache.put(key, results)
+            return results
+        return fetch(query, method_name, args)
+
+    def _map_compact(self, query, method_name, args):
+        return compact_results(
+                self._map_iter(query, method_name, args, raw=True),
+                self._strings)
+
+    def _map_request(self, query, method_name, args):
+        return self._codec.dumps({
             "query": query,
             "operation": {
                 "arguments": args,
                 "method_name": method_name
             }
         })
+
+    def _map_uncached(self, query, method_name, args):
+        data = self._map_request(query, method_name, args)
         res = self._post("map", data)
-        logging.debug("<< %r %r", res.status_code, res.text)
+        logging.debug("<< %r %r", res.status_code, res.content)
 
-        res = self._parse_json(res.text)
+        res = self._parse_json(res.content)
 
         if res['outcome'] != 'SUCCESS':
             raise IOSLibraryException('map %s failed because: %s \n %s' %
                                       (query, res['reason'], res['details']))
         return res['results']
 
+    def _map_iter(self, query, method_name, args=None, raw=False):
+        """
+        Like `_map`, but parses the response while it is downloaded and
+        yields the results one at a time, bypassing the query cache.
+
+        If `raw` is true the results are yielded as undecoded json.
+        """
+        if method_name not in READONLY_METHODS:
+            self._screen_changed()
+        data = self._map_request(query, method_name, args or [])
+        res = self._post("map", data, stream=True)
+        response = IncrementalResponse(
+                res.iter_content(RESPONSE_CHUNK_SIZE), raw)
+        try:
+            for result in response:
+                yield result
+        except ValueError as e:
+            raise IOSLibraryException("Testserver response couldn't be "
+                                      "parsed as json: %s" % e)
+        finally:
+            res.close()
+        members = response.members
+        if members.get('outcome') != 'SUCCESS':
+            raise IOSLibraryException('map %s failed because: %s \n %s' %
+                    (query, members.get('reason'), members.get('details')))
+
     def _parse_json(self, to_parse):
         try:
-            return json.loads(to_parse)
+            with self._metrics.timer('parse_json') as timer:
+                timer.received = len(to_parse)
+                return self._codec.loads(to_parse)
         except ValueError as e:
             raise IOSLibraryException("Testserver response '%s' couldn't be parsed as json: %s" % (to_parse, e.message))
 
     def _screenshot(self, filename=None, relative_url='screenshot'):
-        res = self._get(relative_url)
-        path, link = self._get_screenshot_paths(filename)
-        with open(path, 'w') as f:
-            f.write(res.content)
+        with self._metrics.timer('screenshot'):
+            self._save_screenshot(filename, relative_url)
+
+    def _save_screenshot(self, filename, relative_url):
+        res = self._get(relative_url, stream=True)
+        if not filename and self._screenshot_store is not None:
+            path, link = self._store_screenshot(res)
+        else:
+            path, link = self._get_screenshot_paths(filename)
+            if self._screenshot_writer is not None:
+                self._screenshot_writer.submit(path, res.content)
+            else:
+                with self._metrics.timer('write_screenshot', path=path):
+                    with open(path, 'wb') as f:
+                        for chunk in res.iter_content(SCREENSHOT_CHUNK_SIZE):
+                            f.write(chunk)
         logger.info('</td></tr><tr><td colspan="3"><a href="%s">'
                    '<img src="%s"></a>' % (link, link), True, False)
 
-    def _load_playback_data(self, recording):
+    def _store_screenshot(self, res):
+        """
+        Stores the screenshot in `res` under the digest of its content,
+        unless the same image has been stored before.
+        """
+        logdir = self._get_log_dir()
+        screen_dir = os.path.join(logdir, 'screenshots')
+        if not os.path.exists(screen_dir):
+            os.mkdir(screen_dir)
+        if self._screenshot_writer is not None:
+            data = res.content
+            digest = hashlib.sha1(data).hexdigest()
+            path = os.path.join(screen_dir, '%s.png' % digest)
+            if self._screenshot_store.add(path, len(data)):
+                self._screenshot_writer.submit(path, data)
+        else:
+            fd, tmp_path = tempfile.mkstemp('.part', '', screen_dir)
+            sha1 = hashlib.sha1()
+            size = 0
+            with self._metrics.timer('write_screenshot', path=tmp_path):
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in res.iter_content(SCREENSHOT_CHUNK_SIZE):
+                        sha1.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+            path = os.path.join(screen_dir, '%s.png' % sha1.hexdigest())
+            if self._screenshot_store.add(path, size):
+                os.rename(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+        return path, robot.utils.get_link_path(path, logdir)
+
+    def _load_playback_data(self, recording, speed=None):
+        if speed is None:
+            speed = self._playback_speed
+        encoded = GESTURES.encoded_events(recording, self._ios_major_version,
+                                          self._device, speed)
+        if encoded is None:
+            if not recording.endswith(".base64"):
+                recording = GESTURES.filename(recording,
+                                              self._ios_major_version,
+                                              self._device)
+            raise IOSLibraryException('Playback not found: %s' %
+                    os.path.join(GESTURES.directory, recording))
+        return encoded
+
+    def _playback(self, recording, options=None, speed=None):
+        data = self._load_playback_data(recording, speed)
+        if self._gesture_batch is not None:
+            return self._add_to_batch(recording, data, options)
+        with self._metrics.timer('playback', recording):
+            return self._play(data, options)
+
+    def _parse_speed(self, speed):
+        if speed is None or speed == '':
+            return None
+        try:
+            speed = float(speed)
+        except ValueError:
+            raise IOSLibraryException("%s is not a number" % speed)
+        if speed <= 0:
+            raise IOSLibraryException("Playback speed must be positive, "
+                                      "not %s" % speed)
+        return speed
 
-        if not recording.endswith(".base64"):
-            recording = "%s_ios%d_%s.base64" % (
-                    recording,
-                    self._ios_major_version,
-                    self._device.split(" ")[0].lower())
+    def set_playback_speed(self, speed=1):
+        """
+        Set how much faster recorded gestures are played, e.g. `Swipe`,
+        `Pinch`, `Touch` or `Rotate`.
 
-        p = os.path.join(
-            os.path.join(os.path.dirname(__file__), 'resources'),
-            recording
-        )
-
-        if os.path.exists(p):
-            with open(p, 'r') as f:
-                return f.read()
-        elif self._ios_major_version == 6:
-            # we can reuse most of the ios5 gestures on ios6
-            return self._load_playback_data(recording.replace("6", "5"))
-        else:
-            raise IOSLibraryException('Playback not found: %s' % p)
-
-    def _playback(self, recording, options=None):
-        data = self._load_playback_data(recording)
-        post_data = {
-            "events": data
-        }
-        if options:
-            post_data.update(options)
-        res = self._post('play', json.dumps(post_data))
-        fail = False
-        if res.status_code != 200:
-            fail = True 
-            error_msg = "device url sent status code %s", res.status_code
+        The time between the recorded events is divided by `speed`, but
+        not below a few milliseconds, so the app still registers the
+        movement. Gestures become less realistic, e.g. a sped up swipe is
+        a faster flick, so this is meant for smoke tests.
+
+        `speed` e.g. 2 to play gestures twice as fast, 1 or empty plays
+        them as recorded
+        """
+        # empty means the default speed of the library, not of a keyword
+        self._playback_speed = self._parse_speed(speed) or 1
 
+    def _play_synthesized(self, name, paths, duration, easing,
+                          options=None):
         try:
-            jres = self._parse_json(res.text)
+            data = SYNTHESIZER.encoded_events(
+                    paths, robot.utils.timestr_to_secs(duration), easing,
+                    self._ios_major_version)
+        except ValueError as e:
+            raise IOSLibraryException(str(e))
+        if self._gesture_batch is not None:
+            return self._add_to_batch(name, data, options)
+        with self._metrics.timer('playback', name):
+            return self._play(data, options)
+
+    def _play(self, data, options):
+        self._screen_changed()
+        res = self._post('play', play_request(data, options))
+        error_msg = self._play_error(res.status_code, res.content)
+        if error_msg:
+            raise IOSLibraryException('playback failed because: %s' % error_msg)
+        return res
+
+    def _play_error(self, status_code, content):
+        """
+        Returns why a play request failed, None if it succeeded.
+        """
+        error_msg = None
+        if status_code != 200:
+            error_msg = "device url sent status code %s" % status_code
+        try:
+            jres = self._parse_json(content)
             if jres['outcome'] != 'SUCCESS':
-                fail = True
                 error_msg = "%s %s" % (jres['reason'], jres['details'])
-        except ValueError:
-            pass
+        except IOSLibraryException as e:
+            error_msg = error_msg or str(e)
+        return error_msg
 
-        if fail:
-            raise IOSLibraryException('playback failed because: %s' % error_msg)
-        return res
+    def _add_to_batch(self, name, data, options):
+        self._gesture_batch.append((name, play_request(data, options)))
+
+    def begin_gesture_batch(self):
+        """
+        Collect all following gestures instead of playing them, until
+        `Play Gesture Batch`.
+
+        Gestures are `Touch`, `Touch Position`, `Toggle Switch`,
+        `Touch Text`, `Go Back`, `Swipe`, `Swipe From To`, `Pinch`,
+        `Pinch With Scale` and `Rotate`. All other keywords, e.g. `Query` or
+        `Set Text`, still run right away. Rotations don't wait for the app
+        to rotate when they are batched.
+
+        Example:
+        | Begin Gesture Batch |       |
+        | Swipe               | left  |
+        | Swipe               | left  |
+        | Touch               | button marked:'Done' |
+        | Play Gesture Batch  |       |
+        """
+        self._discard_gesture_batch()
+        self._gesture_batch = []
+
+    def play_gesture_batch(self, pipelined=True):
+        """
+        Play all gestures collected since `Begin Gesture Batch`.
+
+        The gestures are sent over one connection, one after the other but
+        without waiting for the response to the previous one. The outcome
+        of every gesture is logged, the keyword fails listing all gestures
+        that failed. Gestures following a failed one are played anyway.
+
+        `pipelined` if false, every gesture waits for the response to the
+        previous one
+        """
+        batch = self._gesture_batch or []
+        self._gesture_batch = None
+        if not batch:
+            return
+        pipelined = is_truthy(pipelined)
+        self._screen_changed()
+        bodies = [body for name, body in batch]
+        with self._metrics.timer('playback', 'gesture_batch'):
+            if pipelined:
+                responses = self._post_pipelined('play', bodies)
+            else:
+                responses = []
+                for body in bodies:
+                    res = self._post('play', body)
+                    responses.append((res.status_code, res.content))
+        failed = []
+        for step, (name, body) in enumerate(batch):
+            if step < len(responses):
+                error_msg = self._play_error(*responses[step])
+            else:
+                error_msg = "no response, the device closed the connection"
+            logger.info("Gesture %d %s: %s" % (step + 1, name,
+                                               error_msg or "SUCCESS"))
+            if error_msg:
+                failed.append("%d %s: %s" % (step + 1, name, error_msg))
+        if failed:
+            raise IOSLibraryException('playback failed because: %s' %
+                                      "; ".join(failed))
+
+    def _post_pipelined(self, endp, bodies):
+        url = urljoin(self._url, endp)
+        auth = None
+        if self._username is not None:
+            auth = (self._username, self._password)
+        with self._metrics.timer('post', endp, url=url) as timer:
+            try:
+                responses = post_pipelined(url, bodies, JSON_HEADERS,
+                                           self._timeout, auth)
+            except (ValueError, httplib.HTTPException, socket.error) as e:
+                raise IOSLibraryException("gesture batch failed: %s" % e)
+            timer.sent = sum(len(body) for body in bodies)
+            timer.received = sum(len(content) for status, content
+                                 in responses)
+        return responses
+
+    def _discard_gesture_batch(self):
+        if self._gesture_batch:
+            logger.warn("Discarded %d gestures never played, "
+                        "Play Gesture Batch was not called" %
+                        len(self._gesture_batch))
+        self._gesture_batch = None
 
     def _rotate_to(self, orientation, direction="left"):
         orientation = self._reduce_degrees(orientation)
@@ -342,8 +1005,57 @@ class IOSLibrary(object):
         orientation = self._reduce_degrees(orientation)
         orientation = ORIENTATIONS_REV[orientation]
         playback = "rotate_%s_home_%s" % (direction, orientation)
+        if self._gesture_batch is not None:
+            self._playback(playback)
+            return
+        before = self._status_bar_orientation()
         self._playback(playback)
-        time.sleep(1)
+        with self._metrics.timer('sleep', 'rotate'):
+            self._wait_for_rotation(before)
+
+    def _status_bar_orientation(self):
+        from requests import RequestException
+        try:
+            res = self._map(None, "orientation", ["status_bar"])
+        except (IOSLibraryException, RequestException, AssertionError):
+            return None
+        return res and res[0] or None
+
+    def _wait_for_rotation(self, before):
+        """
+        Waits until the app reports an orientation different from `before`,
+        at most for the rotation timeout. If the test server can't report
+        the orientation the full rotation timeout is waited.
+        """
+        start = time.time()
+        deadline = start + self._rotation_timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                logger.info("Rotation did not settle within %.2f seconds" %
+                            self._rotation_timeout)
+                return
+            if before is None:
+                time.sleep(remaining)
+                continue
+            current = self._status_bar_orientation()
+            if current is None:
+                before = None
+            elif current != before:
+                logger.info("Rotation settled after %.2f seconds" %
+                            (time.time() - start))
+                return
+            else:
+                time.sleep(min(remaining, ROTATION_POLL_INTERVAL))
+
+    def set_rotation_timeout(self, timeout="1 second"):
+        """
+        Set how long rotating waits at most for the app to report the new
+        orientation.
+
+        `timeout` e.g. "2 seconds"
+        """
+        self._rotation_timeout = robot.utils.timestr_to_secs(timeout)
 
     def _reduce_degrees(self, degrees):
         while degrees >= 360:
@@ -352,21 +1064,131 @@ class IOSLibrary(object):
             degrees += 360
         return degrees
 
-    def _element_exists(self, query):
+    def _element_exists(self, query, snapshot=False):
+        # the snapshot may be stale, only assertions expecting an element
+        # may trust it
+        if snapshot and self._in_snapshot(query):
+            return True
         if not self.query(query):
             return False
         return True
 
+    def _in_snapshot(self, query):
+        if self._snapshot_ttl is None:
+            return False
+        try:
+            if self._get_snapshot().find(query):
+                self._snapshot_hits += 1
+                return True
+        except UnsupportedQuery:
+            pass
+        self._snapshot_misses += 1
+        return False
+
+    def _texts_on_screen(self, expected, snapshot=False):
+        """
+        Returns the set of `expected` texts shown on the current screen.
+
+        All texts not found in the screen snapshot, if `snapshot` is true,
+        are looked up with a single query OR-ing one predicate per text, the
+        views it returns are matched against each text locally.
+        """
+        found = set(t for t in expected if snapshot and
+                    self._in_snapshot(self._text_query(t)))
+        remaining = [t for t in set(expected) if t not in found]
+        if not remaining:
+            return found
+        patterns = [self._text_pattern(t) for t in remaining]
+        views = self.query("view {%s}" % " OR ".join(
+                "text LIKE '%s'" % p for p in patterns))
+        texts = [view.get("text") for view in views if hasattr(view, "get")]
+        texts = [t for t in texts if isinstance(t, basestring)]
+        for text, pattern in zip(remaining, patterns):
+            regex = like_regex(pattern)
+            if any(regex.match(t) for t in texts):
+                found.add(text)
+        return found
+
+    def _get_snapshot(self):
+        if (self._snapshot is None or
+                time.time() - self._snapshot.taken > self._snapshot_ttl):
+            self._snapshot = Snapshot(self._map_iter("view", "query"))
+        return self._snapshot
+
+    def enable_screen_snapshots(self, ttl="2 seconds"):
+        """
+        Answer `Screen Should Contain`, `Screen Should Contain Text` and
+        `Screen Should Contain Query` from a snapshot of the screen.
+
+        The snapshot is taken with a single query of all visible views and
+        kept until a gesture or a keyword changing the screen is used, or
+        `ttl` expires. Elements not found in the snapshot, and queries using
+        syntax the snapshot doesn't understand, are still looked up on the
+        device, so a snapshot never makes an assertion fail. The wait
+        keywords and the assertions expecting elements or texts to be
+        missing always ask the device.
+
+        `ttl` maximum age of a snapshot, e.g. "500 milliseconds"
+        """
+        self._snapshot_ttl = robot.utils.timestr_to_secs(ttl)
+        self._snapshot = None
+
+    def disable_screen_snapshots(self):
+        """
+        Look up all elements on the device again and log how many lookups
+        the snapshots answered.
+        """
+        if self._snapshot_ttl is not None:
+            logger.info("Screen snapshots: %d hits, %d misses" %
+                        (self._snapshot_hits, self._snapshot_misses))
+        self._snapshot_ttl = None
+        self._snapshot = None
+
+    def take_screen_snapshot(self):
+        """
+        Replace the current screen snapshot with a fresh one, e.g. after the
+        screen changed by itself. Requires `Enable Screen Snapshots`.
+        """
+        assert self._snapshot_ttl is not None, (
+                "Enable Screen Snapshots has to be called first")
+        self._snapshot = None
+        logger.info("Snapshot of %d views" % len(self._get_snapshot()))
+
+    def _text_pattern(self, text):
+        return "*%s*" % text.replace("'", r"\'")
+
+    def _text_query(self, text):
+        return "view {text LIKE '%s'}" % self._text_pattern(text)
+
     def _get_webview_html(self, query=None, index=None):
         if not index: index = 0
         if not query: query = ""
+        index = int(index)
+
+        key = (query, index)
+        html = self._webview_cache.get(key)
+        if html is not None:
+            return html
 
         res = self.query("webView " + (query and query + " " or "") + "css:'body'")
 
-        index = int(index)
-        if not res or not res[index]:
+        if not res or len(res) <= index or not res[index]:
             raise IOSLibraryException("No WebView with index %i found" % index)
-        return res[index]["html"]
+        html = res[index]["html"]
+        self._webview_cache.put(key, html)
+        return html
+
+    def set_webview_cache_timeout(self, timeout=0):
+        """
+        Set how long the html of a webview is reused by the webview
+        keywords, gestures and keywords changing the screen always discard
+        it. By default, and with 0, the html is fetched for every keyword,
+        so retrying a webview keyword sees a page that is still loading.
+
+        `timeout` e.g. "500 milliseconds"
+        """
+        self._webview_cache = ExpiringCache(
+                robot.utils.timestr_to_secs(timeout))
 
     def query(self, query):
         """
@@ -376,6 +1198,19 @@ class IOSLibrary(object):
         """
         return self._map(query, "query")
 
+    def use_compact_results(self, compact=True):
+        """
+        Choose the type of the elements returned by `Query` and `Query All`.
+
+        Compact elements need a fraction of the memory of plain dicts, which
+        matters when many results are kept, e.g. during long scroll
+        sessions. Their attributes are decoded on first access, but they can
+        be used exactly like dicts.
+
+        `compact` true for compact elements, false for plain dicts
+        """
+        self._compact_results = is_truthy(compact)
+
     def query_all(self, query):
         """
         Search for all UIElements matching `query`
@@ -384,11 +1219,144 @@ class IOSLibrary(object):
         """
         return self._map(query, "query_all")
 
-    def _pinch(self, in_out, options={}):
+    def _screen_changed(self):
+        """
+        Called before every gesture and every state changing operation,
+        drops everything that was cached about the current screen.
+        """
+        if self._query_cache is not None:
+            self._query_cache.clear()
+        self._snapshot = None
+        self._webview_cache.clear()
+
+    def enable_query_cache(self, ttl="2 seconds"):
+        """
+        Cache the results of queries for at most `ttl`.
+
+        Repeated queries on an unchanged screen are answered from the cache.
+        Every gesture and every keyword changing the screen, e.g. `Touch`,
+        `Set Text` or `Scroll`, clears the cache. Use `Clear Query Cache` if
+        the screen changes by itself, e.g. after a network request.
+
+        `ttl` maximum age of cached results, e.g. "500 milliseconds"
+        """
+        self._query_cache = ExpiringCache(robot.utils.timestr_to_secs(ttl))
+
+    def disable_query_cache(self):
+        """
+        Stop caching query results and log the cache statistics.
+        """
+        if self._query_cache is not None:
+            self.log_query_cache_statistics()
+        self._query_cache = None
+
+    def clear_query_cache(self):
+        """
+        Drop all cached query results.
+        """
+        self._screen_changed()
+
+    def log_query_cache_statistics(self):
+        """
+        Log hits and misses of the query cache.
+        """
+        if self._query_cache is None:
+            logger.info("Query cache is disabled")
+        else:
+            logger.info("Query cache: %s" % self._query_cache.statistics())
+
+    def get_performance_stats(self):
+        """
+        Returns timings and byte counts of all interactions with the test
+        server so far, per operation and per keyword.
+
+        Operations are `post`, `get`, `map`, `playback`, `parse_json`,
+        `screenshot` and `sleep`.
+        """
+        stats = self._metrics.as_dict()
+        logger.info(json.dumps(stats, indent=2, sort_keys=True))
+        return stats
+
+    def set_performance_stats_file(self, path):
+        """
+        Write the performance statistics to `path` at the end of every suite.
+
+        The file is written in the prometheus text format if `path` ends with
+        ".prom" or ".txt", as json otherwise.
+        """
+        self._performance_stats_file = path
+
+    def _write_performance_stats(self):
+        if self._performance_stats_file:
+            self._metrics.write(self._performance_stats_file)
+
+    def enable_tracing(self, directory=None):
+        """
+        Record a timeline of keywords, requests to the test server, json
+        parsing, screenshot writes and sleeps.
+
+        At the end of every suite the timeline is written to
+        `directory`/ioslibrary-trace-<suite name>.json, which can be opened
+        in chrome://tracing or https://ui.perfetto.dev
+
+        `directory` defaults to the directory of the log file
+        """
+        self._trace_dir = directory or self._get_log_dir()
+        if self._metrics.tracer is None:
+            self._metrics.tracer = Tracer()
+
+    def disable_tracing(self):
+        """
+        Stop recording the timeline and write what was recorded so far.
+        """
+        self._write_trace('ioslibrary')
+        self._metrics.tracer = None
+
+    def _write_trace(self, name):
+        if self._metrics.tracer is None:
+            return
+        filename = 'ioslibrary-trace-%s.json' % re.sub(r'[^\w.-]+', '_',
+                                                       name)
+        self._metrics.tracer.write(os.path.join(self._trace_dir, filename))
+
+    def _map_many(self, queries, method_name, errors=False):
+        """
+        Runs `_map` for every query concurrently, at most `pool_size` at a
+        time, and returns the results in the order of `queries`.
+
+        If `errors` is true an exception raised for a query is returned in
+        place of its results instead of being raised.
+        """
+        def run(query):
+            try:
+                return self._map(query, method_name)
+            except Exception as e:
+                if not errors:
+                    raise
+                return e
+        if len(queries) < 2:
+            return [run(query) for query in queries]
+        if self._workers is None:
+            from multiprocessing.pool import ThreadPool
+            self._workers = ThreadPool(self._pool_size)
+        return self._workers.map(run, queries)
+
+    def query_many(self, *queries):
+        """
+        Search for the UIElements matching each of the `queries`
+
+        The queries are sent concurrently. Returns one list of results per
+        query, in the same order.
+
+        `queries` query selectors. The available syntax is documented here https://github.com/calabash/calabash-ios/wiki/05-Query-syntax
+        """
+        return self._map_many(list(queries), "query")
+
+    def _pinch(self, in_out, options={}, speed=None):
         f = "pinch_in"
         if in_out == "out":
             f = "pinch_out"
-        self._playback(f, options)
+        self._playback(f, options, speed)
 
     # BEGIN: STOLEN FROM SELENIUM2LIBRARY
 
@@ -402,7 +1370,8 @@ class IOSLibrary(object):
         logdir = self._get_log_dir()
         if not filename:
             self._screenshot_index += 1
-            filename = 'ios-screenshot-%d.png' % self._screenshot_index
+            filename = '%sios-screenshot-%d.png' % (self._screenshot_prefix,
+                                                    self._screenshot_index)
             filename = os.path.join('screenshots', filename)
             screen_dir = os.path.join(logdir, 'screenshots')
             if not os.path.exists(screen_dir):
@@ -450,6 +1419,82 @@ class IOSLibrary(object):
         """
         self._screenshot(filename, relative_url)
 
+    def enable_screenshot_deduplication(self):
+        """
+        Store each distinct screenshot only once.
+
+        Screenshots captured without a `filename` are stored under the
+        digest of their content, captures of an unchanged screen link to
+        the already stored image.
+
+        The bytes saved are printed at the end of the run and written to
+        the `Set Performance Stats File`.
+        """
+        if self._screenshot_store is None:
+            self._screenshot_store = ScreenshotStore()
+            self._metrics.screenshots = self._screenshot_store
+
+    def disable_screenshot_deduplication(self):
+        """
+        Store every screenshot in a file of its own again.
+        """
+        if self._screenshot_store is not None:
+            self.log_screenshot_statistics()
+        self._screenshot_store = None
+        self._metrics.screenshots = None
+
+    def log_screenshot_statistics(self):
+        """
+        Log how many screenshots were captured and how many bytes
+        deduplication saved.
+        """
+        if self._screenshot_store is None:
+            logger.info("Screenshot deduplication is disabled")
+        else:
+            self._log_screenshot_statistics()
+
+    def _log_screenshot_statistics(self, also_console=False):
+        logger.info("Screenshots: %s" % self._screenshot_store.statistics(),
+                    also_console=also_console)
+
+    def enable_async_screenshots(self):
+        """
+        Write screenshots to disk in the background.
+
+        `Capture Screenshot` returns as soon as the screenshot is
+        downloaded. Pending screenshots are written at the latest at the end
+        of each suite, use `Flush Screenshots` to wait for them earlier.
+        """
+        if self._screenshot_writer is None:
+            self._screenshot_writer = ScreenshotWriter(self._metrics)
+
+    def disable_async_screenshots(self):
+        """
+        Write screenshots to disk before `Capture Screenshot` returns again.
+
+        Waits for pending screenshots and fails if any could not be written.
+        """
+        self.flush_screenshots()
+        self._screenshot_writer = None
+
+    def flush_screenshots(self):
+        """
+        Wait until all screenshots captured so far are written to disk.
+
+        Fails if any of them could not be written.
+        """
+        self._flush_screenshots(fail=True)
+
+    def _flush_screenshots(self, fail):
+        if self._screenshot_writer is None:
+            return
+        errors = self._screenshot_writer.flush()
+        if errors and fail:
+            raise IOSLibraryException("Could not write screenshots: %s" %
+                                      "; ".join(errors))
+        for error in errors:
+            logger.warn("Could not write screenshot %s" % error)
+
     def toggle_switch(self, name=None):
         """
         Toggle a switch
@@ -530,26 +1575,32 @@ class IOSLibrary(object):
             raise IOSLibraryException("could not find view to scroll: %s" %
                                       query)
 
-    def pinch(self, direction, query=None):
+    def pinch(self, direction, query=None, speed=None):
         """
         Pinch in or out.
 
         `direction` to pinch. Valid values are "in" and "out".
 
         `query` selector of the element to pinch on
+
+        `speed` how much faster than recorded to pinch, defaults to the
+        speed set with `Set Playback Speed`
         """
         options = {}
         if query:
             options = {"query": query}
-        self._pinch(direction, options)
+        self._pinch(direction, options, self._parse_speed(speed))
 
-    def swipe(self, direction, query=None):
+    def swipe(self, direction, query=None, speed=None):
         """
         Swipe.
 
         `direction` The direction to swipe in. Valid values are "up", "down", "left", "right"
 
         `query` query identifiying the element of the screen to be swiped on, e.g. "view marked:'foo'"
+
+        `speed` how much faster than recorded to swipe, defaults to the
+        speed set with `Set Playback Speed`
         """
         degrees = ORIENTATIONS[direction]
         direction = (360 - self._current_orientation) + degrees
@@ -560,7 +1611,74 @@ class IOSLibrary(object):
         if query:
             options["query"] = query
 
-        self._playback("swipe_%s" % direction, options)
+        self._playback("swipe_%s" % direction, options,
+                       self._parse_speed(speed))
+
+    def swipe_from_to(self, start_x, start_y, end_x, end_y,
+                      duration="300 milliseconds", touches=1,
+                      easing="linear"):
+        """
+        Swipe from one position on the screen to another.
+
+        The gesture is synthesized, so it works on every device and iOS
+        version without a recording.
+
+        `start_x`, `start_y` position where the swipe starts
+
+        `end_x`, `end_y` position where the swipe ends
+
+        `duration` time the fingers take to move, e.g. "1 second"
+
+        `touches` number of fingers, at least 1, placed side by side
+
+        `easing` speed curve of the movement, "linear", "ease-in",
+        "ease-out" or "ease-in-out"
+
+        Example:
+        | Swipe From To | 300 | 200 | 20 | 200 | 150 milliseconds |
+        """
+        try:
+            paths = swipe_paths((float(start_x), float(start_y)),
+                                (float(end_x), float(end_y)), int(touches))
+        except ValueError as e:
+            raise IOSLibraryException(str(e))
+        self._play_synthesized("swipe_from_to", paths, duration, easing)
+
+    def pinch_with_scale(self, scale, query=None, x=160, y=240,
+                         distance=100, duration="500 milliseconds",
+                         easing="linear"):
+        """
+        Pinch with two fingers until their distance changed by `scale`.
+
+        The gesture is synthesized, so it works on every device and iOS
+        version without a recording.
+
+        `scale` factor of the distance of the fingers at the end, below 1
+        pinches in, above 1 pinches out
+
+        `query` selector of the element to pinch on, `x` and `y` are used
+        if omitted
+
+        `x`, `y` center of the pinch
+
+        `distance` distance of the fingers at the start, in points, must
+        be positive
+
+        `duration` time the fingers take to move, e.g. "1 second"
+
+        `easing` speed curve of the movement, "linear", "ease-in",
+        "ease-out" or "ease-in-out"
+        """
+        try:
+            paths = pinch_paths((float(x), float(y)), float(distance),
+                                float(scale))
+        except ValueError as e:
+            raise IOSLibraryException(str(e))
+        options = {}
+        if query:
+            options["query"] = query
+        self._play_synthesized("pinch_with_scale", paths, duration, easing,
+                               options)
 
     def screen_should_contain_text(self, expected):
         """
@@ -569,10 +1687,42 @@ class IOSLibrary(object):
         `expected` The text that should be on the screen
         """
 
-        if not self._element_exists("view {text LIKE '*%s*'}" %
-                                    expected.replace("'", r"\'")):
+        if not self._element_exists(self._text_query(expected),
+                                    snapshot=True):
             raise IOSLibraryException("No text %s found" % expected)
 
+    def screen_should_contain_texts(self, *expected):
+        """
+        Asserts that the current screen contains all given texts
+
+        All texts are looked up with a single query, all missing texts are
+        reported at once.
+
+        `expected` The texts that should be on the screen
+
+        Example:
+        | Screen Should Contain Texts | Name | Address | Phone |
+        """
+        found = self._texts_on_screen(expected, snapshot=True)
+        missing = [e for e in expected if e not in found]
+        if missing:
+            raise IOSLibraryException("No text %s found" %
+                                      ", ".join(missing))
+
+    def screen_should_not_contain_texts(self, *unexpected):
+        """
+        Asserts that the current screen contains none of the given texts
+
+        All texts are looked up with a single query, all texts found are
+        reported at once.
+
+        `unexpected` The texts that should not be on the screen
+        """
+        found = self._texts_on_screen(unexpected)
+        present = [u for u in unexpected if u in found]
+        if present:
+            raise IOSLibraryException("Text %s found" % ", ".join(present))
+
     def screen_should_contain(self, expected):
         """
         Asserts that the current screen contains a given element
@@ -580,12 +1730,35 @@ class IOSLibrary(object):
 
         `expected` String or View that should be on the current screen
         """
-        res = (self._element_exists("view marked:'%s'" % expected) or
-               self._element_exists(expected))
+        res = (self._element_exists("view marked:'%s'" % expected,
+                                    snapshot=True) or
+               self._element_exists(expected, snapshot=True))
         if not res:
             raise IOSLibraryException("No element found with mark or text %s" %
                                       expected)
 
+    def screen_should_contain_all(self, *expected):
+        """
+        Asserts that the current screen contains all given elements
+        specified by name or query
+
+        The elements are looked up concurrently, all missing elements are
+        reported at once.
+
+        `expected` Strings or Views that should be on the current screen
+        """
+        expected = list(expected)
+        found = self._map_many(["view marked:'%s'" % e for e in expected],
+                               "query", errors=True)
+        missing = [e for e, res in zip(expected, found)
+                   if not res or isinstance(res, Exception)]
+        found = self._map_many(missing, "query")
+        missing = [e for e, res in zip(missing, found) if not res]
+        if missing:
+            raise IOSLibraryException(
+                    "No element found with mark or text %s" %
+                    ", ".join(missing))
+
     def screen_should_contain_query(self, query):
         """
         Asserts that the current screen contains a given element
@@ -593,7 +1766,7 @@ class IOSLibrary(object):
 
         `query` Element query that should be on the current screen
         """
-        if not self._element_exists(query):
+        if not self._element_exists(query, snapshot=True):
             raise IOSLibraryException(
                     "No element found with query '%s'" % query)
 
@@ -610,6 +1783,56 @@ class IOSLibrary(object):
         if not expected in self._get_webview_html(query, index):
             raise IOSLibraryException("%s not found in webView" % expected)
 
+    def webview_should_contain_all(self, *expected, **options):
+        """
+        Asserts that the current webview contains all of the given texts
+
+        `expected` texts that should be in the webview, an equals sign in a
+        text must be escaped as `\=`
+
+        `index` named argument, index of the webView
+
+        `query` named argument, query to find the webview (e.g. "marked:'Tears in Heaven'", for full query syntax see https://github.com/calabash/calabash-ios/wiki/05-Query-syntax
+
+        Example:
+        | Webview Should Contain All | Google   | Search  |                     |
+        | Webview Should Contain All | @{texts} | index=1 | query=marked:'Help' |
+        """
+        index, query = self._webview_options(options)
+        found = find_all(self._get_webview_html(query, index), expected)
+        missing = [e for e in expected if e not in found]
+        if missing:
+            raise IOSLibraryException("%s not found in webView" %
+                                      ", ".join(missing))
+
+    def webview_should_contain_any(self, *expected, **options):
+        """
+        Asserts that the current webview contains at least one of the given
+        texts
+
+        `expected` texts of which at least one should be in the webview, an
+        equals sign in a text must be escaped as `\=`
+
+        `index` named argument, index of the webView
+
+        `query` named argument, query to find the webview (e.g. "marked:'Tears in Heaven'", for full query syntax see https://github.com/calabash/calabash-ios/wiki/05-Query-syntax
+
+        Example:
+        | Webview Should Contain Any | Sign in | Sign out | index=1 |
+        """
+        index, query = self._webview_options(options)
+        if not find_all(self._get_webview_html(query, index), expected):
+            raise IOSLibraryException("None of %s found in webView" %
+                                      ", ".join(expected))
+
+    def _webview_options(self, options):
+        unknown = sorted(set(options) - set(['index', 'query']))
+        if unknown:
+            raise IOSLibraryException("Unknown arguments %s, only index and "
+                                      "query can be named" %
+                                      ", ".join(unknown))
+        return options.get('index', 0), options.get('query')
+
     def webview_should_not_be_empty(self, index=0, query=None):
         """
         Asserts that the current webview is not empty
@@ -0,0 +1,181 @@
+"""
+Reading and writing of binary property lists, the container format of the
+recorded gestures.
+
+Only the types used by recordings are supported: dicts, arrays, ascii and
+unicode strings, integers, reals and data. `write` lays out the objects
+like the CoreFoundation writer that produced most recordings: depth first,
+the keys of a dict before its values, strings and integers stored once,
+reals as doubles. Reading and writing such a recording therefore gives
+back the same bytes.
+"""
+import struct
+from collections import OrderedDict
+
+HEADER = 'bplist00'
+TRAILER = struct.Struct('>6xBBQQQ')
+
+
+class Data(str):
+    """
+    A data object, to tell it apart from strings.
+    """
+
+
+def _int_size(value):
+    for size in (1, 2, 4):
+        if value < 1 << (8 * size):
+            return size
+    return 8
+
+
+def _uint(raw, offset, size):
+    value = 0
+    for char in raw[offset:offset + size]:
+        value = value << 8 | ord(char)
+    return value
+
+
+def _pack_uint(value, size):
+    return ''.join(chr(value >> 8 * i & 0xff)
+                   for i in reversed(range(size)))
+
+
+def read(raw):
+    """
+    Returns the object stored in the binary property list `raw`. Dicts are
+    returned as `OrderedDict` keeping the order of their keys.
+    """
+    if not raw.startswith(HEADER):
+        raise ValueError("not a binary property list")
+    offset_size, ref_size, count, top, table = TRAILER.unpack(raw[-32:])
+    offsets = [_uint(raw, table + i * offset_size, offset_size)
+               for i in range(count)]
+
+    def length(marker, pos):
+        if marker & 0xf != 0xf:
+            return marker & 0xf, pos
+        size = 1 << (ord(raw[pos]) & 0xf)
+        return _uint(raw, pos + 1, size), pos + 1 + size
+
+    def refs(pos, n):
+        return [_uint(raw, pos + i * ref_size, ref_size) for i in range(n)]
+
+    def parse(ref):
+        pos = offsets[ref]
+        marker = ord(raw[pos])
+        kind = marker >> 4
+        if kind == 0x1:
+            size = 1 << (marker & 0xf)
+            value = _uint(raw, pos + 1, size)
+            if size == 8 and value >= 1 << 63:
+                value -= 1 << 64
+            return value
+        if kind == 0x2:
+            if marker & 0xf == 2:
+                return struct.unpack('>f', raw[pos + 1:pos + 5])[0]
+            return struct.unpack('>d', raw[pos + 1:pos + 9])[0]
+        n, pos = length(marker, pos + 1)
+        if kind == 0x4:
+            return Data(raw[pos:pos + n])
+        if kind == 0x5:
+            return raw[pos:pos + n]
+        if kind == 0x6:
+            return raw[pos:pos + 2 * n].decode('utf-16be')
+        if kind == 0xa:
+            return [parse(r) for r in refs(pos, n)]
+        if kind == 0xd:
+            keys = refs(pos, n)
+            values = refs(pos + n * ref_size, n)
+            return OrderedDict((parse(k), parse(v))
+                               for k, v in zip(keys, values))
+        raise ValueError("unsupported object 0x%02x" % marker)
+
+    return parse(top)
+
+
+class _Writer(object):
+
+    def __init__(self):
+        self.objects = []
+        self.unique = {}
+
+    def flatten(self, value):
+        if isinstance(value, Data):
+            key = None
+        elif isinstance(value, basestring):
+            key = ('string', value)
+        elif isinstance(value, (int, long)) and not isinstance(value, bool):
+            key = ('int', value)
+        else:
+            key = None
+        if key is not None and key in self.unique:
+            return self.unique[key]
+        ref = len(self.objects)
+        self.objects.append(None)
+        if key is not None:
+            self.unique[key] = ref
+        if isinstance(value, dict):
+            keys = [self.flatten(k) for k in value.keys()]
+            values = [self.flatten(v) for v in value.values()]
+            self.objects[ref] = ('dict', keys + values)
+        elif isinstance(value, (list, tuple)):
+            self.objects[ref] = ('array', [self.flatten(v) for v in value])
+        else:
+            self.objects[ref] = ('scalar', value)
+        return ref
+
+    def marker(self, kind, n):
+        if n < 15:
+            return chr(kind << 4 | n)
+        return chr(kind << 4 | 0xf) + self.scalar(n)
+
+    def scalar(self, value):
+        if isinstance(value, Data):
+            return self.marker(0x4, len(value)) + value
+        if isinstance(value, unicode):
+            try:
+                value = value.encode('ascii')
+            except UnicodeEncodeError:
+                return (self.marker(0x6, len(value)) +
+                        value.encode('utf-16be'))
+        if isinstance(value, str):
+            return self.marker(0x5, len(value)) + value
+        if isinstance(value, float):
+            return '\x23' + struct.pack('>d', value)
+        if isinstance(value, (int, long)):
+            if value < 0:
+                return '\x13' + struct.pack('>q', value)
+            size = _int_size(value)
+            return chr(0x10 | {1: 0, 2: 1, 4: 2, 8: 3}[size]) + \
+                _pack_uint(value, size)
+        raise TypeError("unsupported type %s" % type(value).__name__)
+
+    def write(self, value):
+        self.flatten(value)
+        ref_size = _int_size(len(self.objects))
+        chunks = [HEADER]
+        offsets = []
+        position = len(HEADER)
+        for kind, content in self.objects:
+            if kind == 'scalar':
+                chunk = self.scalar(content)
+            else:
+                n = kind == 'dict' and len(content) // 2 or len(content)
+                chunk = (self.marker(kind == 'dict' and 0xd or 0xa, n) +
+                         ''.join(_pack_uint(r, ref_size) for r in content))
+            offsets.append(position)
+            chunks.append(chunk)
+            position += len(chunk)
+        offset_size = _int_size(position)
+        chunks.extend(_pack_uint(o, offset_size) for o in offsets)
+        chunks.append(TRAILER.pack(offset_size, ref_size, len(self.objects),
+                                   0, position))
+        return ''.join(chunks)
+
+
+def write(value):
+    """
+    Returns `value` as binary property list.
+    """
+    return _Writer().write(value)
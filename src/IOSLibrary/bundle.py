@@ -0,0 +1,122 @@
+"""
+Packed bundle of the gesture recordings in `resources/`.
+
+Every distinct recording is stored once, zlib compressed, under the sha1 of
+its content. A json manifest maps the filename of every recording to the
+digest of its content and every digest to the position of its entry. The
+layout of the file is the magic line, the length of the manifest as 4 byte
+big endian integer, the manifest and the entries.
+
+Rebuild the bundle after adding or changing recordings::
+
+    python -m IOSLibrary.bundle src/IOSLibrary/resources
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = 'IOSLIBRARY-GESTURES 1\n'
+BUNDLE_NAME = 'gestures.bundle'
+RECORDING_SUFFIX = '.base64'
+
+
+class GestureBundle(object):
+    """
+    Read only view of a bundle. The file is memory mapped, entries are
+    decompressed when they are read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a gesture bundle" % path)
+        start = len(MAGIC) + 4
+        length, = struct.unpack('>I', self._data[len(MAGIC):start])
+        manifest = json.loads(self._data[start:start + length])
+        self._recordings = manifest['recordings']
+        self._entries = manifest['entries']
+        self._offset = start + length
+
+    def __contains__(self, filename):
+        return filename in self._recordings
+
+    def filenames(self):
+        return self._recordings.keys()
+
+    def digest(self, filename):
+        """
+        Returns the digest of the content of `filename`, the same for all
+        identical recordings.
+        """
+        return self._recordings[filename]
+
+    def read(self, filename):
+        """
+        Returns the recording stored as `filename`.
+        """
+        offset, length = self._entries[self._recordings[filename]]
+        start = self._offset + offset
+        return zlib.decompress(self._data[start:start + length])
+
+    def close(self):
+        self._data.close()
+
+
+def pack(directory, path=None):
+    """
+    Packs all recordings in `directory` into a bundle written to `path`,
+    by default `directory`/gestures.bundle. Returns the path.
+    """
+    if path is None:
+        path = os.path.join(directory, BUNDLE_NAME)
+    recordings = {}
+    entries = {}
+    blobs = []
+    offset = 0
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(RECORDING_SUFFIX):
+            continue
+        with open(os.path.join(directory, filename), 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha1(content).hexdigest()
+        recordings[filename] = digest
+        if digest not in entries:
+            blob = zlib.compress(content, 9)
+            entries[digest] = (offset, len(blob))
+            blobs.append(blob)
+            offset += len(blob)
+    manifest = json.dumps({'recordings': recordings, 'entries': entries},
+                          sort_keys=True, separators=(',', ':'))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('>I', len(manifest)))
+        f.write(manifest)
+        for blob in blobs:
+            f.write(blob)
+    return path
+
+
+def main(args=None):
+    args = args if args is not None else sys.argv[1:]
+    if len(args) not in (1, 2):
+        sys.stderr.write("usage: python -m IOSLibrary.bundle "
+                         "<recordings directory> [<bundle>]\n")
+        return 2
+    path = pack(*args)
+    bundle = GestureBundle(path)
+    size = sum(os.path.getsize(os.path.join(args[0], filename))
+               for filename in bundle.filenames())
+    print("%s: %d recordings, %d distinct, %d bytes instead of %d" % (
+          path, len(bundle.filenames()), len(bundle._entries),
+          os.path.getsize(path), size))
+    bundle.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
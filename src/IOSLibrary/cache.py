@@ -0,0 +1,38 @@
+"""
+Short-lived caches for answers of the test server.
+"""
+import time
+
+
+class ExpiringCache(object):
+    """
+    A dict-like cache whose entries expire `ttl` seconds after they were
+    stored. Counts hits and misses.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = (time.time(), value)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def statistics(self):
+        return "%d hits, %d misses, %d entries" % (
+            self.hits, self.misses, len(self._entries))
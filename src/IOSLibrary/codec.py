@@ -0,0 +1,157 @@
+"""
+JSON codecs for talking to the test server.
+
+The standard library `json` module is always available, `simplejson` and
+`ujson` are used if installed.
+"""
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = ',:]}'
+
+
+class JSONCodec(object):
+
+    def __init__(self, name, module):
+        self.name = name
+        self.dumps = module.dumps
+        self.loads = module.loads
+
+
+def available_codecs():
+    codecs = {'json': JSONCodec('json', json)}
+    try:
+        import simplejson
+        codecs['simplejson'] = JSONCodec('simplejson', simplejson)
+    except ImportError:
+        pass
+    try:
+        import ujson
+        codecs['ujson'] = JSONCodec('ujson', ujson)
+    except ImportError:
+        pass
+    return codecs
+
+
+def get_codec(name=None):
+    """
+    Returns the codec called `name`, or the fastest available one if `name`
+    is None.
+    """
+    codecs = available_codecs()
+    if name is None:
+        for name in ('ujson', 'simplejson', 'json'):
+            if name in codecs:
+                return codecs[name]
+    if name not in codecs:
+        raise ValueError("JSON codec %s is not available, available are: %s"
+                         % (name, ', '.join(sorted(codecs))))
+    return codecs[name]
+
+
+class IncrementalResponse(object):
+    """
+    Parses a test server response of the form {"results": [...], ...} from
+    an iterable of chunks, yielding the items of `results` one at a time.
+
+    All other top level members are available in `members` once they have
+    been parsed, members following `results` only after all results have
+    been consumed.
+
+    If `raw` is true the results are yielded as undecoded json strings.
+    """
+
+    def __init__(self, chunks, raw=False):
+        self.members = {}
+        self._raw = raw
+        self._chunks = iter(chunks)
+        self._buf = ''
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _more(self, size=1):
+        """
+        Appends at least `size` more characters to the buffer, fewer only at
+        the end of the response. Returns False if there were none left.
+        """
+        chunks = []
+        received = 0
+        for chunk in self._chunks:
+            chunks.append(chunk)
+            received += len(chunk)
+            if received >= size:
+                break
+        if not received:
+            return False
+        self._buf = self._buf[self._pos:] + ''.join(chunks)
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while (self._pos < len(self._buf) and
+                   self._buf[self._pos] in _WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._more():
+                raise ValueError("Unexpected end of json response")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError("Expected %r at position %d of json response" %
+                             (char, self._pos))
+        self._pos += 1
+
+    def _value(self, raw=False):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                value = end = None
+            if end is not None:
+                # a value not yet followed by a delimiter may be truncated,
+                # e.g. a number
+                following = end
+                while (following < len(self._buf) and
+                       self._buf[following] in _WHITESPACE):
+                    following += 1
+                if (following < len(self._buf) and
+                        self._buf[following] in _DELIMITERS):
+                    break
+            # at least double the buffered part of the value before trying
+            # again, so a value spanning many chunks is decoded only a
+            # logarithmic number of times
+            if not self._more(max(len(self._buf) - self._pos, 1)):
+                if end is None:
+                    raise ValueError("Invalid json response")
+                break
+        if raw:
+            value = self._buf[self._pos:end]
+        self._pos = end
+        return value
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'results' and self._peek() == '[':
+                self._pos += 1
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value(self._raw)
+                        if self._peek() == ']':
+                            self._pos += 1
+                            break
+                        self._expect(',')
+            else:
+                self.members[key] = self._value()
+            if self._peek() == '}':
+                return
+            self._expect(',')
@@ -0,0 +1,140 @@
+"""
+Compact representation of the elements returned by `query` and `query_all`.
+"""
+import json
+import re
+
+CLASS_RE = re.compile(r'"class"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+STRING_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+
+def top_level_class(raw):
+    """
+    Returns the "class" member of the json object `raw`, None if it has no
+    such string member. Members of nested objects are skipped by counting
+    the brackets outside of strings, without decoding them.
+    """
+    depth = 0
+    pos = 0
+    for m in CLASS_RE.finditer(raw):
+        between = STRING_RE.sub('', raw[pos:m.start()])
+        if '"' in between:
+            # the match is part of a string, e.g. of a key ending in \"class
+            cls = json.loads(raw).get('class')
+            return isinstance(cls, basestring) and cls or None
+        depth += (between.count('{') + between.count('[') -
+                  between.count('}') - between.count(']'))
+        if depth == 1:
+            value = m.group(1)
+            return '\\' in value and json.loads('"%s"' % value) or value
+        pos = m.end()
+    return None
+
+
+class StringTable(object):
+    """
+    Hands out one shared instance per distinct string.
+    """
+
+    def __init__(self):
+        self._strings = {}
+
+    def get(self, string):
+        return self._strings.setdefault(string, string)
+
+
+class Element(object):
+    """
+    One element of a query result, behaving like the dict the test server
+    sent.
+
+    Only the class name is kept decoded, shared between all elements of the
+    same class. All other attributes are kept as the json sent by the test
+    server and decoded on first access.
+    """
+
+    __slots__ = ('cls', '_raw', '_attributes')
+
+    def __init__(self, raw, strings):
+        self._raw = raw
+        self._attributes = None
+        cls = top_level_class(raw)
+        self.cls = cls is not None and strings.get(cls) or None
+
+    def _decoded(self):
+        if self._attributes is None:
+            self._attributes = json.loads(self._raw)
+            self._raw = None
+        return self._attributes
+
+    def __getitem__(self, key):
+        if key == 'class' and self.cls is not None:
+            return self.cls
+        return self._decoded()[key]
+
+    def get(self, key, default=None):
+        if key == 'class' and self.cls is not None:
+            return self.cls
+        return self._decoded().get(key, default)
+
+    def __contains__(self, key):
+        return key in self._decoded()
+
+    def has_key(self, key):
+        return key in self._decoded()
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __len__(self):
+        return len(self._decoded())
+
+    def keys(self):
+        return self._decoded().keys()
+
+    def values(self):
+        return self._decoded().values()
+
+    def items(self):
+        return self._decoded().items()
+
+    def iterkeys(self):
+        return self._decoded().iterkeys()
+
+    def itervalues(self):
+        return self._decoded().itervalues()
+
+    def iteritems(self):
+        return self._decoded().iteritems()
+
+    def copy(self):
+        return self._decoded().copy()
+
+    def to_dict(self):
+        return dict(self._decoded())
+
+    def __eq__(self, other):
+        if isinstance(other, Element):
+            other = other._decoded()
+        return self._decoded() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self._decoded())
+
+
+def compact_results(raw_results, strings):
+    """
+    Turns the raw json results of a query into a list of `Element`.
+    Results that are not json objects are decoded right away.
+    """
+    results = []
+    for raw in raw_results:
+        if raw.startswith('{'):
+            results.append(Element(raw, strings))
+        else:
+            results.append(json.loads(raw))
+    return results
@@ -0,0 +1,154 @@
+"""
+In-memory store of the recorded gestures in `resources/`.
+"""
+import base64
+import json
+import os
+import re
+import threading
+from IOSLibrary import bplist
+from IOSLibrary.bundle import BUNDLE_NAME, GestureBundle
+from IOSLibrary.synthesis import encode_base64
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'resources')
+
+RECORDING_RE = re.compile(r'^(?P<gesture>.+)_ios(?P<ios>\d+)_'
+                          r'(?P<device>[a-z]+)\.base64$')
+
+# iOS versions that may reuse the recordings of other versions, in order
+FALLBACKS = {
+    6: (5,),
+}
+
+# sped up recordings keep at least this time between two events, in
+# nanoseconds, shorter gaps are not registered as movement by the app
+MIN_EVENT_INTERVAL = 8 * 1000 * 1000
+
+
+class GestureStore(object):
+    """
+    Indexes all recordings once by (gesture, iOS version, device family) and
+    keeps the json encoded events of every recording used so far.
+
+    Recordings are read from the gesture bundle in `directory` if there is
+    one, from the single recording files otherwise.
+    """
+
+    def __init__(self, directory=RESOURCES_DIR):
+        self.directory = directory
+        self.bundle = None
+        self._index = None
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def _build_index(self):
+        index = {}
+        bundle_path = os.path.join(self.directory, BUNDLE_NAME)
+        if os.path.exists(bundle_path):
+            self.bundle = GestureBundle(bundle_path)
+            filenames = self.bundle.filenames()
+        else:
+            filenames = os.listdir(self.directory)
+        for filename in filenames:
+            m = RECORDING_RE.match(filename)
+            if m:
+                key = (m.group('gesture'), int(m.group('ios')),
+                       m.group('device'))
+                index[key] = filename
+        for (gesture, ios, device), filename in index.items():
+            for version, fallbacks in FALLBACKS.items():
+                if ios in fallbacks:
+                    index.setdefault((gesture, version, device), filename)
+        return index
+
+    def _ensure_index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build_index()
+
+    def _resolve(self, gesture, ios_major_version, device):
+        self._ensure_index()
+        family = device.split(" ")[0].lower()
+        return self._index.get((gesture, ios_major_version, family))
+
+    def filename(self, gesture, ios_major_version, device):
+        """
+        Returns the filename a recording of `gesture` would have.
+        """
+        family = device.split(" ")[0].lower()
+        return "%s_ios%d_%s.base64" % (gesture, ios_major_version, family)
+
+    def _bundled(self, filename):
+        self._ensure_index()
+        return self.bundle is not None and filename in self.bundle
+
+    def load(self, filename):
+        """
+        Returns the raw recording stored in `filename`.
+        """
+        if self._bundled(filename):
+            return self.bundle.read(filename)
+        with open(os.path.join(self.directory, filename), 'r') as f:
+            return f.read()
+
+    def encoded_events(self, recording, ios_major_version, device,
+                       speed=1):
+        """
+        Returns the json encoded events of `recording`, ready to be embedded
+        into a `play` request, or None if there is no such recording.
+
+        `recording` is either a gesture name or the filename of a recording.
+
+        `speed` factor by which the recording is played faster
+        """
+        if recording.endswith(".base64"):
+            filename = recording
+        else:
+            filename = self._resolve(recording, ios_major_version, device)
+            if filename is None:
+                return None
+        bundled = self._bundled(filename)
+        # identical recordings share one entry of the bundle
+        key = bundled and self.bundle.digest(filename) or filename
+        encoded = self._encoded.get((key, speed))
+        if encoded is None:
+            if not bundled and not os.path.exists(
+                    os.path.join(self.directory, filename)):
+                return None
+            recorded = self.load(filename)
+            if speed != 1:
+                recorded = rescale(recorded, speed)
+            encoded = json.dumps(recorded)
+            self._encoded[(key, speed)] = encoded
+        return encoded
+
+
+def rescale(recording, speed):
+    """
+    Returns `recording` with the time between its events divided by
+    `speed`, but not below `MIN_EVENT_INTERVAL` unless the events were
+    recorded closer together.
+    """
+    events = bplist.read(base64.b64decode(recording))
+    if len(events) < 2:
+        return recording
+    previous = events[0]['Time']
+    time = previous
+    for event in events[1:]:
+        interval = event['Time'] - previous
+        previous = event['Time']
+        time += max(int(interval / speed),
+                    min(interval, MIN_EVENT_INTERVAL))
+        event['Time'] = time
+    return encode_base64(bplist.write(events))
+
+
+def play_request(encoded_events, options=None):
+    """
+    Builds the body of a `play` request around already encoded events.
+    """
+    if not options:
+        return '{"events": %s}' % encoded_events
+    return '{"events": %s, %s' % (encoded_events, json.dumps(options)[1:])
@@ -0,0 +1,303 @@
+"""
+Starting and stopping of simulators.
+
+A launcher starts the process running the app and asks it to quit, the
+`SimulatorSupervisor` does the rest: it waits until the test server in the
+app answers, enforces the start and stop deadlines and kills processes
+which don't quit in time, so a hung simulator never stalls a run.
+
+`SimulatorLauncher` runs the iOS Simulator, directly or through waxsim.
+`FakeLauncher` serves `IOSLibrary.standin` instead, so everything but the
+simulator itself can be exercised on any machine::
+
+    | Set Simulator Launcher | IOSLibrary.launcher.FakeLauncher | boot_delay=2 |
+
+Other launchers implement `launch` and `quit` of `Launcher`.
+"""
+import logging
+import os
+import random
+import subprocess
+import threading
+import time
+
+from IOSLibrary.utils import is_truthy
+
+# poll intervals of the readiness probe, in seconds
+PROBE_INITIAL_INTERVAL = 0.05
+PROBE_MAX_INTERVAL = 0.5
+
+# maximum time a single readiness probe may take, in seconds
+PROBE_TIMEOUT = 2
+
+# time given to a terminated process before it is killed, in seconds
+KILL_GRACE_PERIOD = 2
+
+QUIT_SCRIPT = 'application "iPhone Simulator" quit'
+
+
+class Launcher(object):
+    """
+    Starts the app under test.
+    """
+
+    def launch(self, app_path, sdk, device):
+        """
+        Starts the app at `app_path` and returns its process, an object
+        with the `poll`, `terminate` and `kill` methods of
+        `subprocess.Popen`. Must not wait for the app to become ready.
+        """
+        raise NotImplementedError
+
+    def quit(self, process):
+        """
+        Asks `process` to quit, without waiting for it. `process` is None
+        if the simulator was not started by this launcher.
+
+        May return a helper process, which is killed if it is still
+        running when the stop deadline expires.
+        """
+        return None
+
+
+class SimulatorLauncher(Launcher):
+    """
+    Runs the app in the iOS Simulator, installed by waxsim if waxsim is
+    found.
+
+    `simulator` path to the iOS Simulator executable.
+
+    `waxsim` path to waxsim, or None to start the app binary without
+    installing it.
+    """
+
+    def __init__(self, simulator, waxsim=None):
+        self.simulator = simulator
+        self.waxsim = waxsim
+
+    def _get_app_and_binary(self, app_path):
+        filename, ext = os.path.splitext(app_path)
+        binary = None
+        if ext == '.app':
+            binary = os.path.join(app_path, filename)
+        elif ext == '':
+            app_path = os.path.dirname(app_path)
+            binary = filename
+        return app_path, binary
+
+    def command(self, app_path, sdk, device):
+        assert (os.path.exists(self.simulator) or
+                (self.waxsim and os.path.exists(self.waxsim))), (
+                "neither simulator at %s nor waxsim could be found"
+                % self.simulator)
+        app_path = os.path.expanduser(app_path)
+        assert os.path.exists(app_path), \
+                "Couldn't find app bundle or binary at %s" % app_path
+
+        app_path, binary = self._get_app_and_binary(app_path)
+        if not self.waxsim:
+            assert binary, "Could not parse app binary name"
+            assert os.path.exists(binary), \
+                "Could not find app binary at %s" % app_path
+            logging.warning("Waxsim not found, execute app without installing it in simulator")
+            return [self.simulator,
+                    '-SimulateDevice',
+                    device,
+                    '-SimulateApplication',
+                    binary]
+        return [self.waxsim,
+                '-s',
+                sdk,
+                '-f',
+                device.lower(),
+                app_path]
+
+    def launch(self, app_path, sdk, device):
+        cmd = self.command(app_path, sdk, device)
+        with open("waxsim.log", "w") as logfile:
+            return subprocess.Popen(cmd, stderr=logfile)
+
+    def quit(self, process):
+        return subprocess.Popen(["osascript", "-e", QUIT_SCRIPT])
+
+
+class FakeProcess(object):
+    """
+    The process of a `FakeLauncher`: serves the stand-in once booted.
+    """
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+        self.returncode = None
+        self.standin = None
+        self._lock = threading.Lock()
+        self._boot = threading.Timer(launcher.boot_delay, self._booted)
+        self._boot.daemon = True
+        self._boot.start()
+
+    def _booted(self):
+        from IOSLibrary.standin import CalabashStandIn
+        with self._lock:
+            if self.returncode is not None:
+                return
+            if self.launcher.crash:
+                self.returncode = 1
+            elif not self.launcher.hang:
+                self.standin = CalabashStandIn(
+                        port=self.launcher.port,
+                        latency=self.launcher.latency).start()
+
+    def _exit(self, returncode):
+        self._boot.cancel()
+        with self._lock:
+            if self.returncode is not None:
+                return
+            if self.standin is not None:
+                self.standin.stop()
+                self.standin = None
+            self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        if not self.launcher.ignore_terminate:
+            self._exit(-15)
+
+    def kill(self):
+        self._exit(-9)
+
+
+class FakeLauncher(Launcher):
+    """
+    Pretends to run a simulator by serving `IOSLibrary.standin` on
+    localhost once `boot_delay` seconds have passed.
+
+    `port` port of the stand-in, the port of the device url.
+
+    `boot_delay` seconds until the stand-in answers.
+
+    `hang` the app never answers.
+
+    `crash` the process exits when it should have booted.
+
+    `ignore_quit` the process doesn't quit when asked to.
+
+    `ignore_terminate` the process only exits when killed.
+
+    `latency` seconds added to every response of the stand-in.
+    """
+
+    def __init__(self, port=37265, boot_delay=0, hang=False, crash=False,
+                 ignore_quit=False, ignore_terminate=False, latency=0):
+        self.port = int(port)
+        self.boot_delay = float(boot_delay)
+        self.hang = is_truthy(hang)
+        self.crash = is_truthy(crash)
+        self.ignore_quit = is_truthy(ignore_quit)
+        self.ignore_terminate = is_truthy(ignore_terminate)
+        self.latency = float(latency)
+        self.launched = []
+
+    def launch(self, app_path, sdk, device):
+        process = FakeProcess(self)
+        self.launched.append(process)
+        return process
+
+    def quit(self, process):
+        if process is not None and not self.ignore_quit:
+            process._exit(0)
+        return None
+
+
+class SimulatorSupervisor(object):
+    """
+    Starts and stops the app through `launcher`.
+
+    `probe` callable taking a timeout in seconds, returns True once the
+    test server answers.
+    """
+
+    def __init__(self, launcher, probe):
+        self.launcher = launcher
+        self.probe = probe
+        self.process = None
+        self.boot_time = None
+        self.probes = 0
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, app_path, sdk, device, timeout):
+        """
+        Launches the app and waits up to `timeout` seconds until it
+        answers. The process is killed if it doesn't.
+
+        With a `timeout` of 0 returns right after launching.
+        """
+        start = time.time()
+        self.boot_time = None
+        self.probes = 0
+        self.process = self.launcher.launch(app_path, sdk, device)
+        if not timeout:
+            return
+        deadline = start + timeout
+        interval = PROBE_INITIAL_INTERVAL
+        while True:
+            returncode = self.process.poll()
+            if returncode is not None:
+                self.process = None
+                raise RuntimeError(
+                        "simulator exited with code %s before the app "
+                        "became ready" % returncode)
+            remaining = deadline - time.time()
+            self.probes += 1
+            if remaining > 0 and self.probe(min(remaining, PROBE_TIMEOUT)):
+                self.boot_time = time.time() - start
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.kill()
+                raise RuntimeError(
+                        "app not ready after %.1f seconds (%d probes), "
+                        "simulator killed" % (timeout, self.probes))
+            time.sleep(min(remaining, random.uniform(interval / 2, interval)))
+            interval = min(interval * 2, PROBE_MAX_INTERVAL)
+
+    def stop(self, timeout):
+        """
+        Asks the app to quit and waits up to `timeout` seconds, then kills
+        it. Returns False if the app had to be killed.
+        """
+        deadline = time.time() + timeout
+        helper = self.launcher.quit(self.process)
+        stopped = True
+        if self.process is not None:
+            stopped = self._wait(self.process, deadline)
+            self.kill()
+        if helper is not None and not self._wait(helper, deadline):
+            helper.kill()
+        return stopped
+
+    def kill(self):
+        """
+        Terminates the process, kills it if it doesn't exit within
+        `KILL_GRACE_PERIOD`.
+        """
+        process, self.process = self.process, None
+        if process is None or process.poll() is not None:
+            return
+        process.terminate()
+        if not self._wait(process, time.time() + KILL_GRACE_PERIOD):
+            process.kill()
+            self._wait(process, time.time() + KILL_GRACE_PERIOD)
+
+    def _wait(self, process, deadline):
+        interval = PROBE_INITIAL_INTERVAL
+        while process.poll() is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, interval))
+            interval = min(interval * 2, PROBE_MAX_INTERVAL)
+        return True
@@ -0,0 +1,48 @@
+"""
+Library listener of IOSLibrary.
+
+Only used by Robot Framework 2.8.5 and later, which support library
+listeners.
+"""
+
+
+class LibraryListener(object):
+
+    ROBOT_LISTENER_API_VERSION = 2
+
+    def __init__(self, library):
+        self._library = library
+        self._keywords = []
+
+    def start_keyword(self, name, attrs):
+        self._keywords.append(name)
+        metrics = self._library._metrics
+        metrics.keyword = name
+        if metrics.tracer is not None:
+            metrics.tracer.begin(name, 'keyword')
+
+    def end_keyword(self, name, attrs):
+        if self._keywords:
+            self._keywords.pop()
+        metrics = self._library._metrics
+        metrics.keyword = self._keywords and self._keywords[-1] or None
+        if metrics.tracer is not None:
+            metrics.tracer.end(name, 'keyword')
+
+    def end_test(self, name, attrs):
+        self._library._discard_gesture_batch()
+
+    def end_suite(self, name, attrs):
+        self._library._flush_screenshots(fail=False)
+        # close() runs after the output is written, the summary of the run
+        # is logged at the end of the top level suite instead
+        if (attrs.get('id') == 's1' and
+                self._library._screenshot_store is not None):
+            self._library._log_screenshot_statistics(also_console=True)
+        self._library._write_performance_stats()
+        self._library._write_trace(name)
+
+    def close(self):
+        self._library._stop_warm_simulators()
+        self._library._flush_screenshots(fail=False)
+        self._library._write_performance_stats()
@@ -0,0 +1,165 @@
+"""
+Timing and byte counters for the interactions with the test server.
+"""
+import json
+import threading
+import time
+
+# upper bounds of the histogram buckets, in milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Histogram(object):
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def observe(self, seconds, sent=0, received=0):
+        ms = seconds * 1000
+        for i, bound in enumerate(BUCKETS):
+            if ms <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max, 3),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'],
+                                self.counts)),
+        }
+
+
+class Timer(object):
+    """
+    Measures one operation, set `sent` and `received` to count bytes.
+    """
+
+    def __init__(self, metrics, operation, endpoint, args):
+        self.metrics = metrics
+        self.operation = operation
+        self.endpoint = endpoint
+        self.args = args
+        self.sent = 0
+        self.received = 0
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.time() - self.start
+        self.metrics.observe(self.operation, self.endpoint, duration,
+                             self.sent, self.received)
+        tracer = self.metrics.tracer
+        if tracer is not None:
+            args = dict(self.args)
+            for name in ('endpoint', 'sent', 'received'):
+                if getattr(self, name):
+                    args[name] = getattr(self, name)
+            tracer.complete(self.operation, 'ioslibrary', self.start,
+                            duration, args)
+
+
+class Metrics(object):
+    """
+    Aggregates observations per (operation, endpoint) and per
+    (keyword, operation).
+
+    `screenshots` the `ScreenshotStore` of deduplicated screenshots, its
+    totals are written along with the observations.
+    """
+
+    def __init__(self):
+        self.keyword = None
+        self.tracer = None
+        self.screenshots = None
+        self.by_endpoint = {}
+        self.by_keyword = {}
+        self._lock = threading.Lock()
+
+    def timer(self, operation, endpoint='', **args):
+        return Timer(self, operation, endpoint, args)
+
+    def observe(self, operation, endpoint, seconds, sent=0, received=0):
+        keyword = self.keyword or ''
+        with self._lock:
+            for histograms, key in ((self.by_endpoint, (operation, endpoint)),
+                                    (self.by_keyword, (keyword, operation))):
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram()
+                histogram.observe(seconds, sent, received)
+
+    def as_dict(self):
+        with self._lock:
+            stats = {
+                'operations': dict(
+                    ('%s %s' % key if key[1] else key[0], h.as_dict())
+                    for key, h in self.by_endpoint.items()),
+                'keywords': dict(
+                    ('%s %s' % key, h.as_dict())
+                    for key, h in self.by_keyword.items()),
+            }
+        if self.screenshots is not None:
+            stats['screenshots'] = self.screenshots.as_dict()
+        return stats
+
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            for name, histograms, labels in (
+                    ('ioslibrary_operation', self.by_endpoint,
+                     ('operation', 'endpoint')),
+                    ('ioslibrary_keyword', self.by_keyword,
+                     ('keyword', 'operation'))):
+                lines.append('# TYPE %s_duration_ms histogram' % name)
+                for key, h in sorted(histograms.items()):
+                    label = ','.join('%s="%s"' % (l, v.replace('"', '\\"'))
+                                     for l, v in zip(labels, key))
+                    cumulative = 0
+                    for bound, count in zip(
+                            [str(b) for b in BUCKETS] + ['+Inf'], h.counts):
+                        cumulative += count
+                        lines.append('%s_duration_ms_bucket{%s,le="%s"} %d' %
+                                     (name, label, bound, cumulative))
+                    lines.append('%s_duration_ms_sum{%s} %.3f' %
+                                 (name, label, h.total))
+                    lines.append('%s_duration_ms_count{%s} %d' %
+                                 (name, label, h.count))
+                    lines.append('%s_bytes_sent_total{%s} %d' %
+                                 (name, label, h.bytes_sent))
+                    lines.append('%s_bytes_received_total{%s} %d' %
+                                 (name, label, h.bytes_received))
+        if self.screenshots is not None:
+            for name, value in sorted(self.screenshots.as_dict().items()):
+                lines.append('# TYPE ioslibrary_screenshot_%s gauge' % name)
+                lines.append('ioslibrary_screenshot_%s %d' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Writes the statistics to `path`, in the prometheus text format if
+        it ends with .prom or .txt, as json otherwise.
+        """
+        with open(path, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.prometheus())
+            else:
+                json.dump(self.as_dict(), f, indent=2, sort_keys=True)
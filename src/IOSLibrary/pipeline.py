@@ -0,0 +1,98 @@
+"""
+HTTP pipelining: many requests sent over one connection without waiting
+for the responses in between.
+
+`requests` can't pipeline, so the requests are written to a plain socket
+and the responses are parsed in order with `httplib`.
+"""
+import base64
+import httplib
+import socket
+import threading
+from urlparse import urlsplit
+
+
+class _SharedFile(object):
+    """
+    The buffered file of the connection, which responses can't close.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def close(self):
+        pass
+
+
+class _BufferedSocket(object):
+    """
+    Hands the same buffered file to every response, so bytes of the next
+    response read ahead by one response are not lost.
+    """
+
+    def __init__(self, stream):
+        self._stream = _SharedFile(stream)
+
+    def makefile(self, *args, **kwargs):
+        return self._stream
+
+
+def post_pipelined(url, bodies, headers=None, timeout=None, auth=None):
+    """
+    POSTs every body in `bodies` to `url` over one connection and returns
+    the (status code, body) of the responses, in the order of `bodies`.
+
+    If the server closes the connection early, only the responses received
+    until then are returned.
+
+    `auth` (username, password) for basic authentication
+    """
+    parts = urlsplit(url)
+    if parts.scheme != 'http':
+        raise ValueError("pipelining supports http only, not %s" % url)
+    headers = dict(headers or {})
+    headers['Host'] = parts.netloc
+    if auth is not None:
+        headers['Authorization'] = 'Basic ' + base64.b64encode(
+                '%s:%s' % auth)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    head = ''.join('%s: %s\r\n' % item for item in sorted(headers.items()))
+    payload = ''.join('POST %s HTTP/1.1\r\n%sContent-Length: %d\r\n\r\n%s' %
+                      (path, head, len(body), body) for body in bodies)
+
+    sock = socket.create_connection((parts.hostname, parts.port or 80),
+                                    timeout)
+    try:
+        # written from a thread, a server answering while it still
+        # receives must not block on a full socket buffer
+        errors = []
+
+        def send():
+            try:
+                sock.sendall(payload)
+            except socket.error as e:
+                errors.append(e)
+        sender = threading.Thread(target=send)
+        sender.daemon = True
+        sender.start()
+        stream = _BufferedSocket(sock.makefile('rb'))
+        responses = []
+        try:
+            for body in bodies:
+                res = httplib.HTTPResponse(stream, method='POST')
+                res.begin()
+                responses.append((res.status, res.read()))
+        except (httplib.HTTPException, socket.error):
+            if not responses:
+                raise
+        sender.join()
+        if errors and not responses:
+            raise errors[0]
+        return responses
+    finally:
+        sock.close()
@@ -0,0 +1,202 @@
+"""
+A pool of devices (simulators or real devices running the instrumented app)
+shared by several robot processes.
+
+The pool is described by a json file::
+
+    [
+        {"endpoint": "localhost:37265", "device": "iPhone", "ios_version": 6},
+        {"endpoint": "localhost:37266", "device": "iPad", "ios_version": 6}
+    ]
+
+Leases are lock files in one directory per machine, so processes started
+independently from each other never get the same device, even when their
+pools overlap.
+"""
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+# environment variables used to pin a robot process to a leased device
+ENV_ENDPOINT = 'IOSLIBRARY_DEVICE_ENDPOINT'
+ENV_DEVICE = 'IOSLIBRARY_DEVICE'
+ENV_IOS_VERSION = 'IOSLIBRARY_IOS_VERSION'
+ENV_SHARD = 'IOSLIBRARY_SHARD'
+
+# directory of the lease files shared by all pools on this machine
+LOCK_DIR = os.path.join(tempfile.gettempdir(), 'ioslibrary-pool')
+
+# host names leasing the same device as 127.0.0.1
+LOCAL_HOSTS = ('localhost', '127.0.0.1')
+
+
+class Device(object):
+
+    def __init__(self, endpoint, device="iPhone", ios_version=5):
+        self.endpoint = endpoint
+        self.device = device
+        self.ios_version = int(ios_version)
+
+    @property
+    def url(self):
+        return 'http://%s/' % self.endpoint
+
+    def environment(self):
+        return {
+            ENV_ENDPOINT: self.endpoint,
+            ENV_DEVICE: self.device,
+            ENV_IOS_VERSION: str(self.ios_version),
+        }
+
+    def is_healthy(self, timeout=5):
+        import requests
+        try:
+            return requests.get(self.url + 'version',
+                                timeout=timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def __repr__(self):
+        return '<Device %s %s iOS %d>' % (self.endpoint, self.device,
+                                          self.ios_version)
+
+
+def normalize_endpoint(endpoint):
+    """
+    Returns `endpoint` as host:port, the way all pools name its lease.
+    """
+    endpoint = endpoint.strip().lower()
+    if '://' in endpoint:
+        endpoint = endpoint.split('://', 1)[1]
+    endpoint = endpoint.strip('/')
+    host, sep, port = endpoint.rpartition(':')
+    if host in LOCAL_HOSTS:
+        endpoint = '127.0.0.1:' + port
+    return endpoint
+
+
+def device_from_environment(environ=os.environ):
+    """
+    Returns the device this process was pinned to by the runner, if any.
+    """
+    if ENV_ENDPOINT not in environ:
+        return None
+    return Device(environ[ENV_ENDPOINT], environ.get(ENV_DEVICE, "iPhone"),
+                  environ.get(ENV_IOS_VERSION, 5))
+
+
+class DevicePool(object):
+    """
+    Hands out healthy devices, each to at most one holder at a time.
+
+    `lock_dir` directory for the lease files, by default `LOCK_DIR`. Pools
+    only exclude each other if they share it.
+    """
+
+    def __init__(self, devices, lock_dir=None):
+        self.devices = list(devices)
+        if lock_dir is None:
+            lock_dir = LOCK_DIR
+        self.lock_dir = lock_dir
+        if not os.path.isdir(lock_dir):
+            try:
+                os.makedirs(lock_dir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    @classmethod
+    def from_file(cls, path, lock_dir=None):
+        with open(path) as f:
+            config = json.load(f)
+        return cls([Device(**dict((str(k), v) for k, v in d.items()))
+                    for d in config], lock_dir)
+
+    def _lock_path(self, device):
+        name = normalize_endpoint(device.endpoint).replace(':', '_')
+        return os.path.join(self.lock_dir, name + '.lock')
+
+    def _acquire(self, device):
+        path = self._lock_path(device)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            if not self._is_stale(path):
+                return False
+            # the holder died without releasing the device
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return self._acquire(device)
+        os.write(fd, str(os.getpid()))
+        os.close(fd)
+        return True
+
+    def _is_stale(self, path):
+        try:
+            with open(path) as f:
+                pid = int(f.read() or 0)
+        except (IOError, ValueError):
+            return False
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno == errno.ESRCH
+        return False
+
+    def lease(self, timeout=60, poll_interval=0.5):
+        """
+        Returns a free and healthy device, waits at most `timeout` seconds
+        for one to become available.
+        """
+        deadline = time.time() + timeout
+        while True:
+            for device in self.devices:
+                if not self._acquire(device):
+                    continue
+                if device.is_healthy():
+                    return device
+                self.release(device)
+            if time.time() >= deadline:
+                raise RuntimeError("No healthy device available in pool %r"
+                                   % self.devices)
+            time.sleep(poll_interval)
+
+    def release(self, device):
+        try:
+            os.remove(self._lock_path(device))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def lease_healthy(self, limit=None):
+        """
+        Leases all free devices that pass the health check, at most `limit`
+        of them. The devices are checked concurrently.
+        """
+        devices = [d for d in self.devices if self._acquire(d)]
+        healthy = [None] * len(devices)
+
+        def check(index):
+            healthy[index] = devices[index].is_healthy()
+        checks = [threading.Thread(target=check, args=(i,))
+                  for i in range(len(devices))]
+        for thread in checks:
+            thread.start()
+        for thread in checks:
+            thread.join()
+        leased = []
+        for device, ok in zip(devices, healthy):
+            if ok and (limit is None or len(leased) < limit):
+                leased.append(device)
+            else:
+                self.release(device)
+        return leased
@@ -0,0 +1,109 @@
+"""
+Runs robot suites in parallel on all devices of a device pool.
+
+Every suite runs in a robot process of its own, pinned to one leased
+device. Each device works through the suites one after another, and the
+outputs are merged into one log and report at the end::
+
+    python -m IOSLibrary.runner --pool devices.json --outputdir results \\
+        tests/login.txt tests/search.txt tests/settings.txt
+
+Suites have to use the default device endpoint or leave the endpoint to
+the runner, they must not start or stop simulators themselves.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from Queue import Queue, Empty
+from optparse import OptionParser
+
+from IOSLibrary.pool import DevicePool, ENV_SHARD
+
+
+def _run_shard(index, suite, device, outputdir, robot_args):
+    output = os.path.join(outputdir, 'output-%d.xml' % index)
+    cmd = [sys.executable, '-m', 'robot.run',
+           '--outputdir', outputdir,
+           '--output', os.path.basename(output),
+           '--log', 'NONE',
+           '--report', 'NONE'] + robot_args + [suite]
+    env = dict(os.environ)
+    env.update(device.environment())
+    env[ENV_SHARD] = str(index)
+    with open(os.path.join(outputdir, 'stdout-%d.txt' % index), 'w') as out:
+        subprocess.call(cmd, env=env, stdout=out, stderr=subprocess.STDOUT)
+    return output
+
+
+def run(suites, pool, outputdir, robot_args=(), name=None, lease_timeout=60):
+    """
+    Runs `suites` on the devices of `pool` and merges the outputs.
+
+    Returns the return code of rebot, i.e. the number of failed critical
+    tests.
+    """
+    import robot
+
+    if not os.path.isdir(outputdir):
+        os.makedirs(outputdir)
+    queue = Queue()
+    for index, suite in enumerate(suites):
+        queue.put((index, suite))
+    outputs = [None] * len(suites)
+    devices = pool.lease_healthy(len(suites))
+    if not devices:
+        devices = [pool.lease(lease_timeout)]
+
+    def work(device):
+        while True:
+            try:
+                index, suite = queue.get_nowait()
+            except Empty:
+                return
+            start = time.time()
+            outputs[index] = _run_shard(index, suite, device, outputdir,
+                                        list(robot_args))
+            sys.stdout.write('%-40s %-20s %6.1fs\n' % (
+                suite, device.endpoint, time.time() - start))
+
+    workers = [threading.Thread(target=work, args=(d,)) for d in devices]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        for device in devices:
+            pool.release(device)
+    outputs = [o for o in outputs if o and os.path.exists(o)]
+    options = dict(outputdir=outputdir, output='output.xml')
+    if name:
+        options['name'] = name
+    return robot.rebot(*outputs, **options)
+
+
+def main():
+    parser = OptionParser(usage="%prog --pool devices.json [options] "
+                                "suite [suite ...] [-- robot options]")
+    parser.add_option("--pool", help="json file describing the device pool")
+    parser.add_option("--outputdir", default=".")
+    parser.add_option("--name", help="name of the merged top level suite")
+    parser.add_option("--lease-timeout", type="float", default=60,
+                      help="seconds to wait for a free healthy device")
+    argv = sys.argv[1:]
+    robot_args = []
+    if '--' in argv:
+        robot_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+    options, suites = parser.parse_args(argv)
+    if not options.pool or not suites:
+        parser.error("--pool and at least one suite are required")
+    pool = DevicePool.from_file(options.pool)
+    sys.exit(run(suites, pool, options.outputdir, robot_args, options.name,
+                 options.lease_timeout))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Writing and deduplication of screenshots.
+"""
+import os
+import threading
+from Queue import Queue
+
+
+class ScreenshotWriter(object):
+    """
+    Writes screenshots to disk from a background thread.
+
+    Errors are collected and handed out by `flush`.
+    """
+
+    def __init__(self, metrics):
+        self._metrics = metrics
+        self._queue = Queue()
+        self._errors = []
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            path, data = self._queue.get()
+            try:
+                with self._metrics.timer('write_screenshot', path=path) as t:
+                    t.sent = len(data)
+                    with open(path, 'wb') as f:
+                        f.write(data)
+            except (IOError, OSError) as e:
+                self._errors.append("%s: %s" % (path, e))
+            finally:
+                self._queue.task_done()
+
+    def submit(self, path, data):
+        self._queue.put((path, data))
+
+    def flush(self):
+        """
+        Waits until all submitted screenshots are written and returns the
+        errors that occurred since the last flush.
+        """
+        self._queue.join()
+        errors, self._errors = self._errors, []
+        return errors
+
+
+class ScreenshotStore(object):
+    """
+    Keeps track of the screenshots stored under the digest of their
+    content and of the bytes saved by not storing duplicates.
+    """
+
+    def __init__(self):
+        self.captures = 0
+        self.bytes_saved = 0
+        self._paths = set()
+
+    def add(self, path, size):
+        """
+        Registers a capture stored at `path`. Returns False if the same
+        image is already stored there.
+        """
+        self.captures += 1
+        if path in self._paths or os.path.exists(path):
+            self._paths.add(path)
+            self.bytes_saved += size
+            return False
+        self._paths.add(path)
+        return True
+
+    def statistics(self):
+        return "%d captures, %d unique images, %d bytes saved" % (
+            self.captures, len(self._paths), self.bytes_saved)
+
+    def as_dict(self):
+        return {
+            'captures': self.captures,
+            'unique_images': len(self._paths),
+            'bytes_saved': self.bytes_saved,
+        }
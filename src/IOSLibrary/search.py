@@ -0,0 +1,14 @@
+"""
+Searching many strings in one text.
+"""
+
+
+def find_all(text, needles):
+    """
+    Returns the set of `needles` contained in `text`.
+
+    Every needle is looked up with a plain substring search, which beats a
+    combined regular expression for the few dozen needles of a test. The
+    empty string is contained in every text.
+    """
+    return set(n for n in needles if n in text)
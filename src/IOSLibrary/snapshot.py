@@ -0,0 +1,187 @@
+"""
+Evaluation of a subset of the Calabash query syntax against a snapshot of
+the visible views taken with a single `query`.
+
+Supported are a single class step (`view`, `button`, `view:'MKMapView'`)
+with the filters `marked:'...'`, `index:N` and `{text LIKE '...'}` /
+`{label LIKE '...'}` predicates. Anything else, descendant steps included,
+raises `UnsupportedQuery`: the views are returned without their parents, so
+descendants can't be told apart from views merely lying on top of others.
+
+Class steps only match the exact class, subclasses are not known. A match
+in the snapshot therefore means the element was on the screen when the
+snapshot was taken, a missing match has to be confirmed by the test server.
+"""
+import re
+import time
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<marked>marked:'(?P<marked_value>(?:[^'\\]|\\.)*)')
+      | (?P<index>index:(?P<index_value>\d+))
+      | (?P<predicate>\{\s*(?P<attribute>text|label)\s+LIKE\s+
+            '(?P<pattern>(?:[^'\\]|\\.)*)'\s*\})
+      | (?P<classname>view:'(?P<classname_value>[\w.]+)')
+      | (?P<class>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+
+
+# query keywords that look like class names
+KEYWORDS = frozenset(('first', 'last', 'parent', 'child', 'descendant',
+                      'sibling', 'css', 'xpath', 'all', 'visible'))
+
+
+class UnsupportedQuery(Exception):
+    pass
+
+
+class Step(object):
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.marked = None
+        self.index = None
+        self.predicates = []
+
+
+def _unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _like_to_regex(pattern):
+    # NSPredicate LIKE: * matches any characters, ? a single one
+    parts = []
+    pattern = _unescape(pattern)
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    literal = '*' not in pattern and '?' not in pattern and pattern or None
+    return re.compile('^%s$' % ''.join(parts), re.DOTALL), literal
+
+
+def like_regex(pattern):
+    """
+    Returns a regular expression matching the strings `LIKE 'pattern'`
+    matches, `pattern` escaped as in a query.
+    """
+    return _like_to_regex(pattern)[0]
+
+
+def _class_name(identifier):
+    if identifier == 'view':
+        return None
+    return 'UI' + identifier[0].upper() + identifier[1:]
+
+
+def parse_query(query):
+    """
+    Parses `query` into a list of steps, raises `UnsupportedQuery` if it
+    uses syntax not supported by the snapshot.
+    """
+    steps = []
+    pos = 0
+    query = query.strip()
+    while pos < len(query):
+        m = TOKEN_RE.match(query, pos)
+        if not m or m.end() == pos:
+            raise UnsupportedQuery(query)
+        pos = m.end()
+        if m.group('class') or m.group('classname'):
+            if m.group('classname'):
+                steps.append(Step(m.group('classname_value')))
+            elif m.group('class') in KEYWORDS:
+                raise UnsupportedQuery(query)
+            else:
+                steps.append(Step(_class_name(m.group('class'))))
+            continue
+        if not steps:
+            steps.append(Step(None))
+        step = steps[-1]
+        if m.group('marked'):
+            if step.marked is not None or step.index is not None:
+                raise UnsupportedQuery(query)
+            step.marked = _unescape(m.group('marked_value'))
+        elif m.group('index'):
+            if step.index is not None:
+                raise UnsupportedQuery(query)
+            step.index = int(m.group('index_value'))
+        else:
+            if step.index is not None:
+                raise UnsupportedQuery(query)
+            regex, literal = _like_to_regex(m.group('pattern'))
+            step.predicates.append((m.group('attribute'), regex, literal))
+    if len(steps) != 1:
+        raise UnsupportedQuery(query)
+    return steps
+
+
+class Snapshot(object):
+    """
+    The views of one screen, indexed by class, accessibility label and
+    identifier, and text.
+    """
+
+    def __init__(self, views):
+        self.taken = time.time()
+        self.classes = []
+        self.labels = []
+        self.texts = []
+        self.by_class = {}
+        self.by_mark = {}
+        self.by_text = {}
+        for view in views:
+            if not isinstance(view, dict):
+                continue
+            cls = view.get('class')
+            label = view.get('label')
+            text = view.get('text')
+            self.classes.append(cls)
+            self.labels.append(label)
+            self.texts.append(text)
+            i = len(self.classes) - 1
+            self.by_class.setdefault(cls, []).append(i)
+            for mark in set((label, view.get('id'))):
+                if mark is not None:
+                    self.by_mark.setdefault(mark, []).append(i)
+            if text is not None:
+                self.by_text.setdefault(text, []).append(i)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def _candidates(self, step):
+        texts = [literal for attribute, regex, literal in step.predicates
+                 if attribute == 'text' and literal is not None]
+        if step.marked is None and texts:
+            candidates = self.by_text.get(texts[0], [])
+            if step.cls is not None:
+                candidates = [i for i in candidates
+                              if self.classes[i] == step.cls]
+        elif step.marked is not None:
+            candidates = self.by_mark.get(step.marked, [])
+            if step.cls is not None:
+                candidates = [i for i in candidates
+                              if self.classes[i] == step.cls]
+        elif step.cls is not None:
+            candidates = self.by_class.get(step.cls, [])
+        else:
+            candidates = range(len(self.classes))
+        for attribute, regex, literal in step.predicates:
+            values = attribute == 'text' and self.texts or self.labels
+            candidates = [i for i in candidates
+                          if values[i] is not None and regex.match(values[i])]
+        return candidates
+
+    def find(self, query):
+        """
+        Returns the positions of the views matching `query`.
+        """
+        step, = parse_query(query)
+        matches = self._candidates(step)
+        if step.index is not None:
+            matches = matches[step.index:step.index + 1]
+        return matches
@@ -0,0 +1,265 @@
+"""
+An in-process stand-in for the Calabash iOS Server.
+
+It answers the endpoints used by IOSLibrary (`version`, `map`, `play` and
+`screenshot`) with synthetic data, so the library can be exercised and
+benchmarked without a Mac, a simulator or an instrumented app.
+
+Run it standalone with::
+
+    python -m IOSLibrary.standin --port 37265 --latency 0.005 --views 200
+"""
+import json
+import re
+import socket
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from optparse import OptionParser
+
+MARKED_RE = re.compile(r"marked:'((?:[^'\\]|\\.)*)'")
+TEXT_LIKE_RE = re.compile(r"text LIKE '\*((?:[^'\\]|\\.)*)\*'")
+ORIENTATIONS = {0: "down", 90: "right", 180: "up", 270: "left"}
+DEGREES = dict((name, degrees) for degrees, name in ORIENTATIONS.items())
+CLASSES = ("UILabel", "UIButton", "UITextField", "UIImageView",
+           "UITableViewCell", "UISwitch")
+
+
+def make_views(count, html_size=1024):
+    """
+    Builds a flat synthetic view hierarchy with `count` elements.
+    """
+    views = []
+    for i in range(int(count)):
+        cls = CLASSES[i % len(CLASSES)]
+        frame = {"x": 0, "y": i * 44, "width": 320, "height": 44}
+        views.append({
+            "class": cls,
+            "label": "Label %d" % i,
+            "text": "Text %d" % i,
+            "frame": frame,
+            "rect": dict(frame, center_x=160, center_y=i * 44 + 22),
+            "description": "<%s: 0x%x; frame = (0 %d; 320 44)>" % (
+                cls, 0x1000 + i, i * 44),
+        })
+    views.append({
+        "class": "UIWebView",
+        "label": None,
+        "frame": {"x": 0, "y": 0, "width": 320, "height": 480},
+        "html": ("<p>Lorem ipsum dolor sit amet</p>" *
+                 (int(html_size) // 32 + 1))[:int(html_size)],
+    })
+    return views
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without TCP_NODELAY
+    # Nagle's algorithm and delayed acks add ~40ms to keep-alive requests
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.standin._connections.add(self.connection)
+
+    def finish(self):
+        self.server.standin._connections.discard(self.connection)
+        BaseHTTPRequestHandler.finish(self)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body, content_type='application/json'):
+        standin = self.server.standin
+        standin._count(self.path)
+        if standin.latency:
+            time.sleep(standin.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        endp = self.path.strip('/')
+        if endp == 'version':
+            self._reply(json.dumps({"version": "0.9.x",
+                                    "outcome": "SUCCESS"}))
+        elif endp == 'screenshot':
+            self._reply(self.server.standin.screenshot, 'image/png')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        endp = self.path.strip('/')
+        if endp == 'map':
+            self._reply(json.dumps(self.server.standin.map(json.loads(body))))
+        elif endp == 'play':
+            self.server.standin.play(json.loads(body))
+            self._reply(json.dumps({"outcome": "SUCCESS", "results": []}))
+        else:
+            self.send_error(404)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class CalabashStandIn(object):
+    """
+    Serves synthetic Calabash responses from a background thread.
+
+    `latency` seconds added to every response.
+
+    `views` number of elements in the synthetic view hierarchy.
+
+    `screenshot_size` size of the returned screenshot in bytes.
+
+    `html_size` size of the body html of the synthetic webview in bytes.
+
+    `rotation_delay` seconds until the reported orientation follows a
+    played rotation gesture. Only recordings played at their recorded
+    speed are recognized as rotations.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, views=20,
+                 screenshot_size=256 * 1024, html_size=4 * 1024,
+                 rotation_delay=0.2):
+        self.latency = float(latency)
+        self.rotation_delay = float(rotation_delay)
+        self._rotations = None
+        self.views = make_views(views, html_size)
+        self.screenshot = ('\x89PNG\r\n\x1a\n' +
+                           '\0' * max(0, int(screenshot_size) - 8))
+        self.orientation = "down"
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._server = _Server((host, int(port)), _Handler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        return '%s:%d' % self._server.server_address
+
+    @property
+    def url(self):
+        return 'http://%s/' % self.endpoint
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        # like a quitting app, drop the keep-alive connections as well
+        for connection in list(self._connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def _count(self, path):
+        with self._lock:
+            endp = path.strip('/')
+            self.requests[endp] = self.requests.get(endp, 0) + 1
+
+    def find(self, query):
+        """
+        Returns the views matching `query`. Only `marked:` and
+        `text LIKE '*...*'` predicates, also OR-ed, are understood,
+        everything else matches all views except the webview, unless the
+        query asks for `css:`.
+        """
+        if "css:" in query:
+            return [v for v in self.views if "html" in v]
+        views = [v for v in self.views if "html" not in v]
+        marked = MARKED_RE.search(query)
+        if marked:
+            name = marked.group(1).replace("\\'", "'")
+            views = [v for v in views if name in (v["label"], v["text"])]
+        likes = [like.replace("\\'", "'")
+                 for like in TEXT_LIKE_RE.findall(query)]
+        if likes:
+            views = [v for v in views
+                     if [t for t in likes if t in v["text"]]]
+        return views
+
+    def rotations(self):
+        """
+        Returns the orientation after each recorded rotation, keyed by its
+        events.
+        """
+        if self._rotations is None:
+            from IOSLibrary.gestures import GestureStore, RECORDING_RE
+            store = GestureStore()
+            store._ensure_index()
+            rotations = {}
+            for filename in store._index.values():
+                gesture = RECORDING_RE.match(filename).group('gesture')
+                if gesture.startswith('rotate_'):
+                    # rotate_<direction>_home_<position of the home button
+                    # before the rotation>
+                    direction, home = gesture.split('_')[1::2]
+                    degrees = DEGREES[home] + (direction == 'left' and 90
+                                               or 270)
+                    rotations[store.load(filename)] = \
+                        ORIENTATIONS[degrees % 360]
+            self._rotations = rotations
+        return self._rotations
+
+    def play(self, request):
+        orientation = self.rotations().get(request.get("events"))
+        if orientation is None:
+            return
+        if not self.rotation_delay:
+            self.orientation = orientation
+            return
+
+        def rotated():
+            self.orientation = orientation
+        timer = threading.Timer(self.rotation_delay, rotated)
+        timer.daemon = True
+        timer.start()
+
+    def map(self, request):
+        method_name = request["operation"]["method_name"]
+        if method_name == "orientation":
+            return {"outcome": "SUCCESS", "results": [self.orientation]}
+        views = self.find(request["query"])
+        if method_name in ("query", "query_all"):
+            results = views
+        else:
+            results = [v["description"] for v in views if "description" in v]
+        return {"outcome": "SUCCESS", "results": results}
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--host", default="127.0.0.1")
+    parser.add_option("--port", type="int", default=37265)
+    parser.add_option("--latency", type="float", default=0,
+                      help="seconds added to every response")
+    parser.add_option("--views", type="int", default=20,
+                      help="number of elements in the view hierarchy")
+    parser.add_option("--screenshot-size", type="int", default=256 * 1024)
+    parser.add_option("--html-size", type="int", default=4 * 1024)
+    parser.add_option("--rotation-delay", type="float", default=0.2,
+                      help="seconds until a rotation settles")
+    options, args = parser.parse_args()
+    standin = CalabashStandIn(options.host, options.port, options.latency,
+                              options.views, options.screenshot_size,
+                              options.html_size, options.rotation_delay)
+    standin._server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
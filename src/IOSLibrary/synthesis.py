@@ -0,0 +1,198 @@
+"""
+Synthesis of gestures in the playback format of the recordings in
+`resources/`.
+
+A recording is a base64 encoded binary property list holding one event per
+touch sample. Every event carries a GraphicsServices hand info structure:
+the phase of the gesture, followed by one path per finger with its
+position, pressure and radius. `encode_events` builds a recording from
+explicit samples, `stroke` computes the samples of fingers moving in a
+straight line with an easing curve.
+"""
+import base64
+import json
+import math
+import struct
+from collections import namedtuple, OrderedDict
+from IOSLibrary import bplist
+
+HAND_DOWN = 1
+HAND_MOVED = 2
+HAND_UP = 6
+
+# GraphicsServices event type of touch events
+TOUCH_EVENT = 3001
+
+# time between two touch samples, in seconds
+SAMPLE_INTERVAL = 1 / 60.0
+
+# arbitrary start of the synthesized timeline, in nanoseconds
+START_TIME = 10 ** 12
+
+# distance between the fingers of multi finger swipes, in points
+FINGER_SPACING = 40
+
+# the finger paths as recorded in the iOS 6 pinch recordings
+PathStyle = namedtuple('PathStyle', 'first_index identity touching lifted '
+                                    'pressure radius extra')
+DEFAULT_STYLE = PathStyle(first_index=1, identity=2, touching=3, lifted=0,
+                          pressure=0.0, radius=5.0, extra=0)
+
+EASINGS = {
+    'linear': lambda t: t,
+    'ease-in': lambda t: t * t,
+    'ease-out': lambda t: 1 - (1 - t) * (1 - t),
+    'ease-in-out': lambda t: t * t * (3 - 2 * t),
+}
+
+Sample = namedtuple('Sample', 'time phase points')
+
+
+def hand_info(phase, points, style=DEFAULT_STYLE, ios_major_version=5):
+    """
+    Returns the hand info structure of one event with a path per point.
+    iOS 4 stores the number of paths one byte earlier than later versions,
+    and its paths lack their last field.
+    """
+    proximity = style.lifted if phase == HAND_UP else style.touching
+    touching = proximity and len(points) or 0
+    if ios_major_version >= 5:
+        counts = (0, 0, len(points), 0)
+    else:
+        counts = (0, len(points), 0, 0)
+    chunks = [struct.pack('<IHH24xBBBB', phase, len(points), touching,
+                          *counts)]
+    for i, (x, y) in enumerate(points):
+        chunks.append(struct.pack('<BBBBffff', style.first_index + i,
+                                  style.identity, proximity, 0,
+                                  style.pressure, style.radius, x, y))
+        if ios_major_version >= 5:
+            chunks.append(struct.pack('<I', style.extra))
+        chunks.append('\0' * 4)
+    return ''.join(chunks)
+
+
+def _location(point):
+    return OrderedDict((('X', float(point[0])), ('Y', float(point[1]))))
+
+
+def encode_base64(raw):
+    """
+    Returns `raw` base64 encoded in lines of 64 characters, like the
+    recordings.
+    """
+    encoded = base64.b64encode(raw)
+    return ''.join(encoded[i:i + 64] + '\n'
+                   for i in range(0, len(encoded), 64))
+
+
+def encode_events(samples, style=DEFAULT_STYLE, ios_major_version=5):
+    """
+    Returns the recording of `samples`, base64 encoded.
+    """
+    events = []
+    for sample in samples:
+        data = hand_info(sample.phase, sample.points, style,
+                         ios_major_version)
+        events.append(OrderedDict((
+            ('Time', int(sample.time)),
+            ('Data', bplist.Data(data)),
+            ('WindowLocation', _location(sample.points[0])),
+            ('Location', _location(sample.points[0])),
+            ('Type', TOUCH_EVENT),
+        )))
+    return encode_base64(bplist.write(events))
+
+
+def stroke(paths, duration, easing='linear', interval=SAMPLE_INTERVAL,
+           start_time=START_TIME):
+    """
+    Returns the samples of fingers moving from their start to their end
+    point in `duration` seconds.
+
+    `paths` one ((start x, start y), (end x, end y)) per finger
+    """
+    if not paths:
+        raise ValueError("a gesture needs at least one finger")
+    if duration < 0:
+        raise ValueError("duration must not be negative, not %s" % duration)
+    try:
+        ease = EASINGS[easing]
+    except KeyError:
+        raise ValueError("unknown easing %r, use one of %s" % (
+                         easing, ", ".join(sorted(EASINGS))))
+    steps = max(1, int(math.ceil(duration / interval)))
+
+    def points(t):
+        t = ease(t)
+        return [(x0 + (x1 - x0) * t, y0 + (y1 - y0) * t)
+                for (x0, y0), (x1, y1) in paths]
+
+    def time(step):
+        return start_time + int(round(duration * 1e9 * step / steps))
+
+    samples = [Sample(time(0), HAND_DOWN, points(0))]
+    for step in range(1, steps + 1):
+        samples.append(Sample(time(step), HAND_MOVED,
+                              points(step / float(steps))))
+    samples.append(Sample(time(steps), HAND_UP, points(1)))
+    return samples
+
+
+def swipe_paths(start, end, touches=1):
+    """
+    Returns the paths of `touches` fingers side by side, swiping from
+    `start` to `end`.
+    """
+    if touches < 1:
+        raise ValueError("touches must be at least 1, not %s" % touches)
+    paths = []
+    for i in range(touches):
+        dx = (i - (touches - 1) / 2.0) * FINGER_SPACING
+        paths.append(((start[0] + dx, start[1]), (end[0] + dx, end[1])))
+    return paths
+
+
+def pinch_paths(center, distance, scale, angle=45):
+    """
+    Returns the paths of two fingers on both sides of `center`, moving from
+    `distance` points apart to `distance` * `scale` points apart.
+    """
+    if distance <= 0:
+        raise ValueError("distance must be positive, not %s" % distance)
+    dx = math.cos(math.radians(angle)) / 2
+    dy = math.sin(math.radians(angle)) / 2
+    cx, cy = center
+    paths = []
+    for sign in (-1, 1):
+        start = (cx + sign * dx * distance, cy + sign * dy * distance)
+        end = (cx + sign * dx * distance * scale,
+               cy + sign * dy * distance * scale)
+        paths.append((start, end))
+    return paths
+
+
+class GestureSynthesizer(object):
+    """
+    Keeps the json encoded events of every synthesized gesture, keyed by
+    its parameters.
+    """
+
+    def __init__(self):
+        self._encoded = {}
+
+    def encoded_events(self, paths, duration, easing='linear',
+                       ios_major_version=5):
+        """
+        Returns the json encoded events of fingers moving along `paths`,
+        ready to be embedded into a `play` request.
+        """
+        paths = tuple((tuple(start), tuple(end)) for start, end in paths)
+        key = (paths, duration, easing, ios_major_version)
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            samples = stroke(paths, duration, easing)
+            encoded = json.dumps(encode_events(
+                    samples, ios_major_version=ios_major_version))
+            self._encoded[key] = encoded
+        return encoded
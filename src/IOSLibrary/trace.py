@@ -0,0 +1,44 @@
+"""
+Timeline of keywords and test server interactions in the trace event
+format, viewable in chrome://tracing or https://ui.perfetto.dev
+"""
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+
+    def __init__(self):
+        self.events = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _add(self, event):
+        event['pid'] = self._pid
+        event['tid'] = threading.current_thread().ident
+        with self._lock:
+            self.events.append(event)
+
+    def complete(self, name, category, start, duration, args=None):
+        self._add({'name': name, 'cat': category, 'ph': 'X',
+                   'ts': start * 1e6, 'dur': duration * 1e6,
+                   'args': args or {}})
+
+    def begin(self, name, category):
+        self._add({'name': name, 'cat': category, 'ph': 'B',
+                   'ts': time.time() * 1e6})
+
+    def end(self, name, category):
+        self._add({'name': name, 'cat': category, 'ph': 'E',
+                   'ts': time.time() * 1e6})
+
+    def write(self, path):
+        """
+        Writes the events recorded since the last write to `path`.
+        """
+        with self._lock:
+            events, self.events = self.events, []
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
@@ -0,0 +1,17 @@
+"""
+Helpers shared by the keywords and the launchers.
+"""
+
+# strings given as robot arguments which mean false
+FALSE_STRINGS = ('', 'false', 'no', 'off', '0', 'none')
+
+
+def is_truthy(value):
+    """
+    Returns whether `value`, e.g. a flag given as a robot argument, means
+    true. Strings are false if they are empty or one of `FALSE_STRINGS`,
+    ignoring case and surrounding whitespace.
+    """
+    if isinstance(value, basestring):
+        return value.strip().lower() not in FALSE_STRINGS
+    return bool(value)
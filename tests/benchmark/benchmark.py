@@ -0,0 +1,134 @@
+"""
+Keyword latency benchmark against the Calabash stand-in server.
+
+Measures throughput and p50/p95/p99 latency of the most used keywords
+without a simulator, e.g.::
+
+    python tests/benchmark/benchmark.py --iterations 500 --output bench.json
+    python tests/benchmark/benchmark.py --baseline bench.json
+
+With `--baseline` the run fails if the p95 latency of any keyword got
+worse than the baseline by more than `--tolerance`.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from robot.variables import GLOBAL_VARIABLES
+from IOSLibrary import IOSLibrary
+from IOSLibrary.standin import CalabashStandIn
+
+KEYWORDS = [
+    ('query', lambda lib: lib.query("view marked:'Label 1'")),
+    ('query_all', lambda lib: lib.query_all("view")),
+    ('touch', lambda lib: lib.touch("button")),
+    ('swipe', lambda lib: lib.swipe("left")),
+    ('capture_screenshot', lambda lib: lib.capture_screenshot()),
+    ('screen_should_contain_texts',
+     lambda lib: lib.screen_should_contain_texts("Text 1", "Text 2",
+                                                 "Text 3", "Text 4")),
+    ('webview_should_contain',
+     lambda lib: lib.webview_should_contain("Lorem ipsum")),
+]
+
+
+def percentile(sorted_values, pct):
+    index = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def run(lib, iterations, warmup=10):
+    stats = {}
+    for name, keyword in KEYWORDS:
+        for i in range(warmup):
+            keyword(lib)
+        timings = []
+        start = time.time()
+        for i in range(iterations):
+            t = time.time()
+            keyword(lib)
+            timings.append(time.time() - t)
+        total = time.time() - start
+        timings.sort()
+        stats[name] = {
+            'iterations': iterations,
+            'throughput': iterations / total,
+            'p50': percentile(timings, 50) * 1000,
+            'p95': percentile(timings, 95) * 1000,
+            'p99': percentile(timings, 99) * 1000,
+        }
+    return stats
+
+
+def report(stats, out=sys.stdout):
+    out.write('%-28s %10s %9s %9s %9s\n' % (
+        'keyword', 'calls/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name, keyword in KEYWORDS:
+        s = stats[name]
+        out.write('%-28s %10.1f %9.3f %9.3f %9.3f\n' % (
+            name, s['throughput'], s['p50'], s['p95'], s['p99']))
+
+
+def compare(stats, baseline, tolerance):
+    regressions = []
+    for name, s in sorted(stats.items()):
+        if name not in baseline:
+            continue
+        limit = baseline[name]['p95'] * (1 + tolerance)
+        if s['p95'] > limit:
+            regressions.append('%s: p95 %.3fms > %.3fms' % (
+                name, s['p95'], limit))
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--iterations", type="int", default=200)
+    parser.add_option("--latency", type="float", default=0,
+                      help="seconds the stand-in adds to every response")
+    parser.add_option("--views", type="int", default=50)
+    parser.add_option("--screenshot-size", type="int", default=256 * 1024)
+    parser.add_option("--html-size", type="int", default=4 * 1024)
+    parser.add_option("--output", help="write the results as json")
+    parser.add_option("--baseline", help="json results to compare against")
+    parser.add_option("--tolerance", type="float", default=0.25,
+                      help="allowed relative p95 regression, default 0.25")
+    options, args = parser.parse_args()
+
+    standin = CalabashStandIn(latency=options.latency, views=options.views,
+                              screenshot_size=options.screenshot_size,
+                              html_size=options.html_size).start()
+    outdir = tempfile.mkdtemp(prefix='ioslibrary-bench-')
+    GLOBAL_VARIABLES['${LOG FILE}'] = 'NONE'
+    GLOBAL_VARIABLES['${OUTPUTDIR}'] = outdir
+    try:
+        lib = IOSLibrary(standin.endpoint)
+        # measure the round trip of the webview keywords, not the cache
+        lib.set_webview_cache_timeout(0)
+        stats = run(lib, options.iterations)
+    finally:
+        standin.stop()
+        shutil.rmtree(outdir)
+
+    report(stats)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(stats, f, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(stats, json.load(f), options.tolerance)
+        for regression in regressions:
+            sys.stderr.write('REGRESSION %s\n' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory needed to keep query results as plain dicts or as compact elements,
+measured as resident set size on linux.
+
+Every mode runs in a fresh process and keeps all results of `--repeat`
+query_all responses of `--views` elements each, like a long scroll session
+collecting results::
+
+    python tests/benchmark/elements_benchmark.py --views 10000
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.codec import IncrementalResponse
+from IOSLibrary.elements import StringTable, compact_results
+from IOSLibrary.standin import make_views
+
+CHUNK_SIZE = 64 * 1024
+
+
+def rss_kb():
+    # resident memory of this process, linux only
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def load(mode, body, strings):
+    if mode == 'dict':
+        return json.loads(body)['results']
+    chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    return compact_results(IncrementalResponse(chunks, raw=True), strings)
+
+
+def child(mode, views, repeat):
+    body = json.dumps({"outcome": "SUCCESS", "results": make_views(views)})
+    baseline = rss_kb()
+    strings = StringTable()
+    kept = []
+    start = time.time()
+    for i in range(repeat):
+        kept.extend(load(mode, body, strings))
+    elapsed = time.time() - start
+    start = time.time()
+    labels = sum(1 for element in kept if element['class'] == 'UILabel')
+    access = time.time() - start
+    kept_kb = rss_kb() - baseline
+    print(json.dumps({'elements': len(kept), 'load': elapsed,
+                      'access': access, 'labels': labels,
+                      'kept_kb': kept_kb}))
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--views", type="int", default=10000)
+    parser.add_option("--repeat", type="int", default=5)
+    parser.add_option("--child", help=None)
+    options, args = parser.parse_args()
+    if options.child:
+        return child(options.child, options.views, options.repeat)
+
+    print('%d x %d elements kept' % (options.repeat, options.views))
+    print('%-10s %12s %12s %14s' % ('mode', 'load s', 'class s',
+                                    'kept mem MB'))
+    for mode in ('dict', 'compact'):
+        out = subprocess.check_output(
+            [sys.executable, __file__, '--child', mode,
+             '--views', str(options.views), '--repeat', str(options.repeat)])
+        res = json.loads(out)
+        print('%-10s %12.3f %12.3f %14.1f' % (mode, res['load'],
+                                              res['access'],
+                                              res['kept_kb'] / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Size and startup cost of the gesture recordings, read from the single
+recording files or from the packed gesture bundle::
+
+    python tests/benchmark/gestures_benchmark.py --repeat 50
+
+`first` is the time a fresh store needs for its first gesture, including
+indexing, `all` the time to load every recording once.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.bundle import BUNDLE_NAME, RECORDING_SUFFIX
+from IOSLibrary.gestures import GestureStore, RESOURCES_DIR
+
+
+def measure(directory, filenames, repeat):
+    first = total = 0
+    for i in range(repeat):
+        store = GestureStore(directory)
+        start = time.time()
+        store.encoded_events('swipe_left', 5, 'iPhone')
+        first += time.time() - start
+        for filename in filenames:
+            store.encoded_events(filename, 5, 'iPhone')
+        total += time.time() - start
+        if store.bundle is not None:
+            store.bundle.close()
+    return first / repeat, total / repeat
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--repeat", type="int", default=50)
+    options, args = parser.parse_args()
+
+    filenames = sorted(f for f in os.listdir(RESOURCES_DIR)
+                       if f.endswith(RECORDING_SUFFIX))
+    files_dir = tempfile.mkdtemp(prefix='ioslibrary-gestures-')
+    try:
+        for filename in filenames:
+            shutil.copy(os.path.join(RESOURCES_DIR, filename), files_dir)
+        sizes = {
+            'files': sum(os.path.getsize(os.path.join(files_dir, f))
+                         for f in filenames),
+            'bundle': os.path.getsize(os.path.join(RESOURCES_DIR,
+                                                   BUNDLE_NAME)),
+        }
+        print('%d recordings' % len(filenames))
+        print('%-10s %10s %12s %12s' % ('source', 'bytes', 'first ms',
+                                        'all ms'))
+        for source, directory in (('files', files_dir),
+                                  ('bundle', RESOURCES_DIR)):
+            first, total = measure(directory, filenames, options.repeat)
+            print('%-10s %10d %12.3f %12.3f' % (source, sizes[source],
+                                                first * 1000, total * 1000))
+    finally:
+        shutil.rmtree(files_dir)
+
+
+if __name__ == '__main__':
+    main()
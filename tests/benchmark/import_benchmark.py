@@ -0,0 +1,85 @@
+"""
+Time needed to import IOSLibrary and to construct the library, as paid by
+every robot process, dry run and libdoc run::
+
+    python tests/benchmark/import_benchmark.py --repeat 20 --path-dirs 50
+
+Every measurement runs in a fresh process. `--path-dirs` puts that many
+directories of `--files` files each on the PATH, like a crowded developer
+machine.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from optparse import OptionParser
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', '..', 'src')
+
+CHILD = """
+import sys, time, json
+sys.path.insert(0, %r)
+import robot.api, robot.variables
+start = time.time()
+import IOSLibrary
+imported = time.time()
+IOSLibrary.IOSLibrary()
+constructed = time.time()
+print(json.dumps({'import': imported - start,
+                  'construct': constructed - imported,
+                  'requests': 'requests' in sys.modules}))
+"""
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def make_path(dirs, files):
+    root = tempfile.mkdtemp(prefix='ioslibrary-path-')
+    path = []
+    for i in range(dirs):
+        d = os.path.join(root, 'bin%d' % i)
+        os.mkdir(d)
+        for j in range(files):
+            open(os.path.join(d, 'tool%d' % j), 'w').close()
+        path.append(d)
+    return root, os.pathsep.join(path + [os.environ.get('PATH', '')])
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--repeat", type="int", default=20)
+    parser.add_option("--path-dirs", type="int", default=0)
+    parser.add_option("--files", type="int", default=200,
+                      help="files per directory added to the PATH")
+    options, args = parser.parse_args()
+
+    env = dict(os.environ)
+    root = None
+    if options.path_dirs:
+        root, env['PATH'] = make_path(options.path_dirs, options.files)
+    try:
+        results = []
+        for i in range(options.repeat):
+            out = subprocess.check_output(
+                [sys.executable, '-c', CHILD % SRC_DIR], env=env)
+            results.append(json.loads(out))
+    finally:
+        if root:
+            shutil.rmtree(root)
+    print('%d runs, %d extra PATH directories' % (options.repeat,
+                                                 options.path_dirs))
+    print('import     %8.2f ms' % (median(r['import'] for r in results)
+                                   * 1000))
+    print('construct  %8.2f ms' % (median(r['construct'] for r in results)
+                                   * 1000))
+    print('requests imported: %s' % results[0]['requests'])
+
+
+if __name__ == '__main__':
+    main()
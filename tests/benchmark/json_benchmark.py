@@ -0,0 +1,87 @@
+"""
+CPU time and peak memory of parsing large query_all responses.
+
+Every parse mode runs in a fresh process on the same synthetic response::
+
+    python tests/benchmark/json_benchmark.py --views 20000
+
+Modes:
+
+- `text`: decode the body to unicode first, then parse it (the old way)
+- `bytes-<codec>`: parse the body bytes with each installed codec
+- `stream`: parse incrementally from 64k chunks, one result at a time
+"""
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.codec import IncrementalResponse, available_codecs
+from IOSLibrary.standin import make_views
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse(mode, body):
+    if mode == 'text':
+        return len(json.loads(body.decode('utf-8'))['results'])
+    if mode == 'stream':
+        chunks = (body[i:i + CHUNK_SIZE]
+                  for i in range(0, len(body), CHUNK_SIZE))
+        count = 0
+        for result in IncrementalResponse(chunks):
+            count += 1
+        return count
+    codec = available_codecs()[mode.split('-', 1)[1]]
+    return len(codec.loads(body)['results'])
+
+
+def child(mode, path):
+    with open(path, 'rb') as f:
+        body = f.read()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cpu = time.clock()
+    count = parse(mode, body)
+    cpu = time.clock() - cpu
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(json.dumps({'mode': mode, 'results': count, 'cpu': cpu,
+                      'peak_kb': peak}))
+
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("--views", type="int", default=20000)
+    parser.add_option("--child", nargs=2, help=None)
+    options, args = parser.parse_args()
+    if options.child:
+        return child(*options.child)
+
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'wb') as f:
+        json.dump({"outcome": "SUCCESS",
+                   "results": make_views(options.views)}, f)
+    size = os.path.getsize(path)
+    modes = (['text'] + ['bytes-%s' % c for c in sorted(available_codecs())]
+             + ['stream'])
+    print('%d views, %.1f MB response' % (options.views, size / 1e6))
+    print('%-18s %10s %14s' % ('mode', 'cpu s', 'peak mem MB'))
+    try:
+        for mode in modes:
+            out = subprocess.check_output(
+                [sys.executable, __file__, '--child', mode, path])
+            res = json.loads(out)
+            print('%-18s %10.3f %14.1f' % (mode, res['cpu'],
+                                          res['peak_kb'] / 1024.0))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Checks that every keyword changing the screen empties the query cache,
+against the stand-in::
+
+    python tests/cache/check_invalidation.py
+
+A query is cached, the keyword is run, and the same query has to reach the
+stand-in again. Fails if any keyword leaves a cached result behind.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from robot.variables import GLOBAL_VARIABLES
+from IOSLibrary import IOSLibrary
+from IOSLibrary.standin import CalabashStandIn
+
+QUERY = "view marked:'Label 1'"
+
+KEYWORDS = (
+    ('Touch', lambda lib: lib.touch("button")),
+    ('Touch Position', lambda lib: lib.touch_position(10, 10)),
+    ('Set Text', lambda lib: lib.set_text("Spam")),
+    ('Scroll', lambda lib: lib.scroll("down")),
+    ('Toggle Switch', lambda lib: lib.toggle_switch()),
+    ('Swipe', lambda lib: lib.swipe("left")),
+    ('Pinch', lambda lib: lib.pinch("in")),
+    ('Swipe From To', lambda lib: lib.swipe_from_to(10, 10, 200, 10)),
+    ('Pinch With Scale', lambda lib: lib.pinch_with_scale(2)),
+    ('Rotate', lambda lib: lib.rotate("left")),
+    ('Play Gesture Batch', lambda lib: (lib.begin_gesture_batch(),
+                                        lib.swipe("right"),
+                                        lib.play_gesture_batch())),
+)
+
+
+def check(lib, standin, keyword):
+    lib.query(QUERY)
+    before = standin.requests.get('map', 0)
+    lib.query(QUERY)
+    assert standin.requests.get('map', 0) == before, "query not cached"
+    keyword(lib)
+    assert not len(lib._query_cache), "%d cached results left" % len(
+        lib._query_cache)
+    before = standin.requests.get('map', 0)
+    lib.query(QUERY)
+    assert standin.requests.get('map', 0) == before + 1, (
+        "query answered from the cache")
+
+
+def main():
+    standin = CalabashStandIn(rotation_delay=0).start()
+    outdir = tempfile.mkdtemp(prefix='ioslibrary-cache-')
+    GLOBAL_VARIABLES['${LOG FILE}'] = 'NONE'
+    GLOBAL_VARIABLES['${OUTPUTDIR}'] = outdir
+    failures = []
+    try:
+        lib = IOSLibrary(standin.endpoint)
+        lib.enable_query_cache("1 minute")
+        for name, keyword in KEYWORDS:
+            try:
+                check(lib, standin, keyword)
+                print('%-30s ok' % name)
+            except Exception:
+                print('%-30s FAILED' % name)
+                traceback.print_exc()
+                failures.append(name)
+    finally:
+        standin.stop()
+        shutil.rmtree(outdir)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Checks `IOSLibrary.codec.IncrementalResponse` against `json.loads`::
+
+    python tests/codec/check_incremental.py
+
+Every response is fed in chunks of every size from one byte to the whole
+response, so each value is also split at every position. Fails if any
+parse differs from `json.loads`.
+
+A single result of several megabytes, fed in network sized chunks, also
+has to be parsed in about the time of `json.loads`, not once per chunk.
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.codec import IncrementalResponse
+
+RESPONSES = (
+    # results before and after other members
+    '{"results": [1, 2, 3], "outcome": "SUCCESS"}',
+    '{"outcome": "SUCCESS", "results": [{"a": 1}, {"b": [2, 3]}]}',
+    '{"outcome": "SUCCESS", "results": ["x"], "details": {"n": 1}}',
+    # empty results, no results, empty response
+    '{"outcome": "SUCCESS", "results": []}',
+    '{"results": [ ] , "outcome": "SUCCESS"}',
+    '{"outcome": "FAILURE", "reason": "no such view"}',
+    '{}',
+    # results which are not a list
+    '{"results": null, "outcome": "SUCCESS"}',
+    '{"results": {"label": "x"}, "outcome": "SUCCESS"}',
+    '{"results": "landscape"}',
+    # escaped strings, split escapes and delimiters inside strings
+    r'{"results": ["a \"quoted\" \\ value", "\u00e9\u4e2d", "],}{:,"]}',
+    # utf-8 encoded characters, split between their bytes
+    '{"results": ["\xc3\xa9\xe4\xb8\xad"], "label": "\xe2\x82\xac"}',
+    r'{"results": [{"text": "line\nbreak\ttab \/ slash"}], "x": "\""}',
+    # numbers, which are only complete once followed by a delimiter
+    '{"results": [12345678901234, -0.5e-10, 3.25, 0, -7], "count": 1024}',
+    '{"count": 99999, "results": [1e300, 2E+3]}',
+    # whitespace everywhere
+    ' \n{ "results" :\n[ 1 ,\t{ "a" : [ ] } ] ,\r\n"outcome" : true }\n',
+)
+
+# a single result spanning many chunks, e.g. a whole view hierarchy
+LARGE = json.dumps({"results": [[
+    {"class": "UILabel", "label": "Label %d" % i,
+     "frame": {"x": i, "y": 2, "width": 30, "height": 40}}
+    for i in range(40000)]], "outcome": "SUCCESS"})
+
+LARGE_CHUNK_SIZE = 8192
+
+# parsing LARGE may take this many times as long as json.loads
+LARGE_SLOWDOWN = 5
+
+TRUNCATED = (
+    '{"results": [1, 2',
+    '{"results": [1, 2], "outcome": "SUCC',
+    '{"results": ["abc',
+)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def parse(text, size, raw=False):
+    response = IncrementalResponse(chunked(text, size), raw)
+    results = list(response)
+    return results, response.members
+
+
+def check(text):
+    expected = json.loads(text)
+    results = expected.pop('results', None)
+    if not isinstance(results, list):
+        if 'results' in json.loads(text):
+            expected['results'] = results
+        results = []
+    failures = []
+    for size in range(1, len(text) + 1):
+        got = parse(text, size)
+        if got != (results, expected):
+            failures.append('chunk size %d: %r' % (size, got))
+        raw_results, members = parse(text, size, raw=True)
+        if [json.loads(r) for r in raw_results] != results:
+            failures.append('chunk size %d raw: %r' % (size, raw_results))
+    return failures
+
+
+def check_truncated(text):
+    failures = []
+    for size in range(1, len(text) + 1):
+        try:
+            parse(text, size)
+        except ValueError:
+            continue
+        failures.append('chunk size %d: no error' % size)
+    return failures
+
+
+def check_large(text):
+    start = time.time()
+    expected = json.loads(text)
+    baseline = time.time() - start
+    start = time.time()
+    got = parse(text, LARGE_CHUNK_SIZE)
+    elapsed = time.time() - start
+    failures = []
+    if got != (expected.pop('results'), expected):
+        failures.append('chunk size %d: results differ' % LARGE_CHUNK_SIZE)
+    if elapsed > LARGE_SLOWDOWN * baseline + 0.5:
+        failures.append('%.2f seconds, json.loads took %.2f seconds' % (
+            elapsed, baseline))
+    return failures
+
+
+def main():
+    failed = 0
+    for text, checker in ([(t, check) for t in RESPONSES] +
+                          [(t, check_truncated) for t in TRUNCATED] +
+                          [(LARGE, check_large)]):
+        failures = checker(text)
+        print('%-60s %s' % (' '.join(text.split())[:60],
+                            failures and 'FAILED' or 'ok'))
+        for failure in failures[:3]:
+            print('    ' + failure)
+        failed += bool(failures)
+    if failed:
+        sys.stderr.write('FAILED %d responses\n' % failed)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
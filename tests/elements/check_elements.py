@@ -0,0 +1,112 @@
+"""
+Checks the compact elements of `Use Compact Results` against the dicts
+they stand for::
+
+    python tests/elements/check_elements.py
+
+Every element has to answer the dict methods like the decoded json and
+take its class name only from the top level "class" member. Fails if any
+check does.
+"""
+import json
+import os
+import sys
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.elements import Element, StringTable, compact_results
+
+RAW = (
+    '{"class": "UILabel", "label": "Title", "frame": {"x": 0, "y": 4}}',
+    # nested class members, before and after the top level one
+    '{"layer": {"class": "CALayer"}, "class": "UIButton", "id": "ok"}',
+    '{"children": [{"class": "UILabel"}], "label": "No class"}',
+    # class members inside strings
+    '{"text": "\\"class\\": \\"UIFake\\"", "class": "UITextField"}',
+    '{"a\\"class": "UIFake", "class": "UISlider"}',
+    # class members which are not strings, or escaped
+    '{"class": null, "label": "x"}',
+    '{"class": 7}',
+    '{"class": "My\\"View\\u00e9", "label": null}',
+    '{ "class" :"UIView" }',
+    '{}',
+)
+
+CLASSES = ('UILabel', 'UIButton', None, 'UITextField', 'UISlider', None,
+           None, u'My"View\xe9', 'UIView', None)
+
+
+def elements():
+    strings = StringTable()
+    return [Element(raw, strings) for raw in RAW]
+
+
+def check_class():
+    for element, raw, cls in zip(elements(), RAW, CLASSES):
+        assert element.cls == cls, (raw, element.cls)
+        expected = json.loads(raw)
+        assert element.get('class') == expected.get('class'), raw
+        if 'class' in expected:
+            assert element['class'] == expected['class'], raw
+
+
+def check_shared_class_names():
+    strings = StringTable()
+    first, second = [Element('{"class": "UILabel", "n": %d}' % i, strings)
+                     for i in range(2)]
+    assert first.cls is second.cls
+
+
+def check_dict_methods():
+    for element, raw in zip(elements(), RAW):
+        expected = json.loads(raw)
+        assert element == expected, raw
+        assert len(element) == len(expected), raw
+        assert sorted(element) == sorted(expected), raw
+        assert sorted(element.keys()) == sorted(expected.keys()), raw
+        assert sorted(element.iterkeys()) == sorted(expected), raw
+        assert sorted(element.itervalues()) == sorted(
+            expected.itervalues()), raw
+        assert sorted(element.iteritems()) == sorted(
+            expected.iteritems()), raw
+        assert sorted(element.items()) == sorted(expected.items()), raw
+        for key in expected:
+            assert key in element and element.has_key(key), (raw, key)
+        assert not element.has_key('missing'), raw
+        copy = element.copy()
+        assert type(copy) is dict and copy == expected, raw
+        copy['added'] = 1
+        assert 'added' not in element, "copy shares the attributes"
+        assert element.to_dict() == expected, raw
+
+
+def check_compact_results():
+    raw = ['{"class": "UILabel"}', '"landscape"', '3', 'null', '[1, 2]']
+    results = compact_results(raw, StringTable())
+    assert isinstance(results[0], Element), results
+    assert results[1:] == ['landscape', 3, None, [1, 2]], results
+
+
+CHECKS = (check_class, check_shared_class_names, check_dict_methods,
+          check_compact_results)
+
+
+def main():
+    failures = []
+    for check in CHECKS:
+        try:
+            check()
+            print('%-30s ok' % check.__name__)
+        except Exception:
+            print('%-30s FAILED' % check.__name__)
+            traceback.print_exc()
+            failures.append(check.__name__)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Checks the sped up recordings of `Set Playback Speed`::
+
+    python tests/gestures/check_rescale.py
+
+Every recording is rescaled by several speeds: each time between two
+events has to become `max(gap / speed, min(gap, MIN_EVENT_INTERVAL))`,
+everything but the times has to stay as recorded, and the store has to
+keep one entry per recording and speed.
+"""
+import base64
+import json
+import sys
+import os
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary import bplist
+from IOSLibrary.gestures import (MIN_EVENT_INTERVAL, RECORDING_RE,
+                                 GestureStore, rescale)
+
+SPEEDS = (0.5, 1.5, 2, 4, 1000)
+
+
+def events(recording):
+    return bplist.read(base64.b64decode(recording))
+
+
+def gaps(recorded):
+    times = [event['Time'] for event in recorded]
+    return [b - a for a, b in zip(times, times[1:])]
+
+
+def expected_gap(gap, speed):
+    return max(int(gap / speed), min(gap, MIN_EVENT_INTERVAL))
+
+
+def check_recording(store, filename):
+    recording = store.load(filename)
+    recorded = events(recording)
+    for speed in SPEEDS:
+        rescaled = events(rescale(recording, speed))
+        assert len(rescaled) == len(recorded), "events lost"
+        assert rescaled[0]['Time'] == recorded[0]['Time'], (
+            "first event moved at speed %s" % speed)
+        expected = [expected_gap(gap, speed) for gap in gaps(recorded)]
+        assert gaps(rescaled) == expected, (
+            "times at speed %s differ" % speed)
+        for before, after in zip(recorded, rescaled):
+            before = dict(before, Time=None)
+            after = dict(after, Time=None)
+            assert before == after, "not only times changed at speed %s" % (
+                speed,)
+
+
+def check_cached(store, filename):
+    gesture, ios, device = RECORDING_RE.match(filename).group(
+        'gesture', 'ios', 'device')
+    encoded = {}
+    for speed in SPEEDS + (1,):
+        encoded[speed] = store.encoded_events(gesture, int(ios), device,
+                                              speed=speed)
+        assert store.encoded_events(gesture, int(ios), device,
+                                    speed=speed) is encoded[speed], (
+            "speed %s not cached" % speed)
+    assert json.loads(encoded[1]) == store.load(filename), (
+        "speed 1 not played as recorded")
+    for speed in SPEEDS:
+        assert json.loads(encoded[speed]) == rescale(
+            store.load(filename), speed), "speed %s mixed up" % speed
+
+
+def main():
+    store = GestureStore()
+    filenames = sorted(name for name in os.listdir(store.directory)
+                       if RECORDING_RE.match(name))
+    failures = []
+    for filename in filenames:
+        try:
+            check_recording(store, filename)
+            check_cached(store, filename)
+            print('%-40s ok' % filename)
+        except Exception:
+            print('%-40s FAILED' % filename)
+            traceback.print_exc()
+            failures.append(filename)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
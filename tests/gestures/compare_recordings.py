@@ -0,0 +1,224 @@
+"""
+Compares synthesized gestures byte for byte with the recordings in
+`resources/`::
+
+    python tests/gestures/compare_recordings.py
+
+For every recording the touch samples and finger style are extracted and
+fed to `IOSLibrary.synthesis.encode_events`. Recordings made by hand carry
+uninitialized bytes and can't be reproduced, but the synthetic recordings
+listed in `REPRODUCIBLE` have to come out identical, otherwise the script
+fails.
+
+The pinches and wheels of `REPRODUCIBLE` are also built from parameters,
+with `pinch_paths` or `swipe_paths` and `stroke`. Their recorded timing
+and finger positions can't be expressed by these parameters, so the
+recording is compared with the synthesized times and positions put in;
+everything else has to be identical.
+
+Finally the gestures of `Swipe From To` and `Pinch With Scale`, as encoded
+by `GestureSynthesizer` for every iOS version, are read back like a
+recording and have to give the synthesized samples.
+"""
+import base64
+import json
+import math
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary import bplist
+from IOSLibrary.gestures import RECORDING_RE, RESOURCES_DIR
+from IOSLibrary.synthesis import (HAND_UP, GestureSynthesizer, PathStyle,
+                                  Sample, encode_base64, encode_events,
+                                  pinch_paths, stroke, swipe_paths)
+
+REPRODUCIBLE = (
+    'pinch_in_ios6_ipad.base64',
+    'pinch_in_ios6_iphone.base64',
+    'pinch_out_ios6_ipad.base64',
+    'pinch_out_ios6_iphone.base64',
+    'wheel_down_ios4_ipad.base64',
+    'wheel_down_ios4_iphone.base64',
+    'wheel_up_ios4_ipad.base64',
+    'wheel_up_ios4_iphone.base64',
+    'wheel_down_ios5_ipad.base64',
+    'wheel_down_ios5_iphone.base64',
+    'wheel_up_ios5_ipad.base64',
+    'wheel_up_ios5_iphone.base64',
+)
+
+
+def paths(data, path_size):
+    # iOS 4 stores the number of paths one byte earlier
+    count = ord(data[path_size == 28 and 34 or 33])
+    for i in range(count):
+        yield data[36 + i * path_size:36 + (i + 1) * path_size]
+
+
+def extract(events, ios_major_version):
+    """
+    Returns the samples and the finger style of recorded `events`.
+    """
+    path_size = ios_major_version >= 5 and 28 or 24
+    samples = []
+    style = None
+    lifted = 0
+    for event in events:
+        data = event['Data']
+        phase = struct.unpack('<I', data[:4])[0]
+        points = []
+        for path in paths(data, path_size):
+            index, identity, proximity, pad, pressure, radius, x, y = \
+                struct.unpack('<BBBBffff', path[:20])
+            extra = path_size == 28 and struct.unpack('<I', path[20:24])[0]
+            points.append((x, y))
+            if phase == HAND_UP:
+                lifted = proximity
+            elif style is None:
+                style = (index, identity, proximity, pressure, radius,
+                         extra or 0)
+        samples.append(Sample(event['Time'], phase, points))
+    first_index, identity, touching, pressure, radius, extra = style
+    return samples, PathStyle(first_index, identity, touching, lifted,
+                              pressure, radius, extra)
+
+
+def read(filename):
+    with open(os.path.join(RESOURCES_DIR, filename)) as f:
+        recorded = f.read()
+    ios = int(RECORDING_RE.match(filename).group('ios'))
+    return recorded, ios, bplist.read(base64.b64decode(recorded))
+
+
+def compare(filename):
+    recorded, ios, events = read(filename)
+    if not [e for e in events if 'Data' in e and len(e['Data']) > 36]:
+        return None
+    samples, style = extract(events, ios)
+    return encode_events(samples, style, ios) == recorded
+
+
+def parameters(samples):
+    """
+    Returns the finger paths, duration and sample interval of a stroke
+    from the first to the last position of the recorded `samples`.
+    """
+    first, last = samples[0].points, samples[-1].points
+    if len(first) == 2:
+        (x0, y0), (x1, y1) = first
+        distance = math.hypot(x1 - x0, y1 - y0)
+        end_distance = math.hypot(last[1][0] - last[0][0],
+                                  last[1][1] - last[0][1])
+        paths = pinch_paths(((x0 + x1) / 2, (y0 + y1) / 2), distance,
+                            end_distance / distance,
+                            math.degrees(math.atan2(y1 - y0, x1 - x0)))
+    else:
+        paths = swipe_paths(first[0], last[0])
+    duration = (samples[-1].time - samples[0].time) / 1e9
+    # one down and one up sample around the moves
+    steps = len(samples) - 2
+    return paths, duration, duration / (steps - 0.5)
+
+
+def put(events, samples, path_size):
+    """
+    Puts the times and positions of `samples` into the recorded `events`.
+    """
+    for event, sample in zip(events, samples):
+        event['Time'] = sample.time
+        data = event['Data']
+        for i, (x, y) in enumerate(sample.points):
+            offset = 36 + i * path_size + 12
+            data = data[:offset] + struct.pack('<ff', x, y) + \
+                data[offset + 8:]
+        event['Data'] = bplist.Data(data)
+        for name in ('WindowLocation', 'Location'):
+            event[name]['X'] = float(sample.points[0][0])
+            event[name]['Y'] = float(sample.points[0][1])
+
+
+def compare_parameters(filename):
+    recorded, ios, events = read(filename)
+    samples, style = extract(events, ios)
+    paths, duration, interval = parameters(samples)
+    synthesized = stroke(paths, duration, interval=interval,
+                         start_time=samples[0].time)
+    if len(synthesized) != len(samples):
+        return False
+    put(events, synthesized, ios >= 5 and 28 or 24)
+    return (encode_events(synthesized, style, ios) ==
+            encode_base64(bplist.write(events)))
+
+
+def rounded(points):
+    # positions are stored as 32 bit floats
+    return [(round(x, 3), round(y, 3)) for x, y in points]
+
+
+def check_synthesizer():
+    """
+    Returns the gestures of the synthesizer which don't read back as
+    synthesized.
+    """
+    synthesizer = GestureSynthesizer()
+    gestures = (
+        ('swipe', swipe_paths((40, 200), (280, 220), touches=2), 0.3),
+        ('pinch', pinch_paths((160, 240), 100, 0.5), 0.5),
+    )
+    failures = []
+    for ios in (4, 5, 6):
+        for name, paths, duration in gestures:
+            encoded = json.loads(synthesizer.encoded_events(
+                    paths, duration, 'ease-in-out', ios))
+            events = bplist.read(base64.b64decode(encoded))
+            expected = [(s.phase, rounded(s.points))
+                        for s in stroke(paths, duration, 'ease-in-out')]
+            try:
+                samples, style = extract(events, ios)
+                read_back = [(s.phase, rounded(s.points)) for s in samples]
+            except (TypeError, struct.error):
+                read_back = None
+            if read_back != expected:
+                failures.append('%s ios%d' % (name, ios))
+    return failures
+
+
+def main():
+    failures = []
+    for filename in sorted(os.listdir(RESOURCES_DIR)):
+        if not RECORDING_RE.match(filename):
+            continue
+        try:
+            identical = compare(filename)
+            result = identical and 'identical' or 'different'
+        except (ValueError, KeyError, TypeError, struct.error):
+            identical = False
+            result = 'different event layout'
+        if identical is None:
+            continue
+        print('%-45s %s' % (filename, result))
+        if filename in REPRODUCIBLE and not identical:
+            failures.append(filename)
+    for filename in REPRODUCIBLE:
+        identical = compare_parameters(filename)
+        print('%-45s %s' % (filename, identical and
+                            'identical from parameters' or
+                            'different from parameters'))
+        if not identical:
+            failures.append(filename + ' from parameters')
+    synthesizer_failures = check_synthesizer()
+    print('%-45s %s' % ('GestureSynthesizer', synthesizer_failures and
+                        'different ' + ', '.join(synthesizer_failures) or
+                        'identical'))
+    failures.extend(synthesizer_failures)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
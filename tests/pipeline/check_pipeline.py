@@ -0,0 +1,208 @@
+"""
+Checks `IOSLibrary.pipeline.post_pipelined` against the stand-in and
+against scripted servers misbehaving in ways the stand-in doesn't::
+
+    python tests/pipeline/check_pipeline.py
+
+Fails if any check does.
+"""
+import base64
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary import IOSLibrary, IOSLibraryException
+from IOSLibrary.pipeline import post_pipelined
+from IOSLibrary.standin import CalabashStandIn
+
+SUCCESS = '{"outcome": "SUCCESS", "results": []}'
+
+RESPONSE = ('HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n'
+            'Content-Length: %d\r\n\r\n%s')
+
+
+class ScriptedServer(object):
+    """
+    Accepts one connection and hands it to `script`, which gets the
+    server to read requests with.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.requests = []
+        self._sock = socket.socket()
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(1)
+        self.url = 'http://127.0.0.1:%d/play' % self._sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _serve(self):
+        conn, address = self._sock.accept()
+        self.stream = conn.makefile('rb')
+        try:
+            self.script(self, conn)
+        finally:
+            self.stream.close()
+            conn.close()
+            self._sock.close()
+
+    def read_request(self):
+        """
+        Reads one request, returns its headers and body.
+        """
+        headers = {}
+        request_line = self.stream.readline()
+        if not request_line:
+            return None
+        while True:
+            line = self.stream.readline().rstrip('\r\n')
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.lower()] = value.strip()
+        body = self.stream.read(int(headers.get('content-length', 0)))
+        self.requests.append((headers, body))
+        return headers, body
+
+    def join(self):
+        self._thread.join(10)
+
+
+def reply(conn, body):
+    conn.sendall(RESPONSE % (len(body), body))
+
+
+def check_responses_in_order():
+    standin = CalabashStandIn(views=30).start()
+    try:
+        queries = ["view marked:'Label %d'" % i for i in range(30)]
+        bodies = [json.dumps({"query": q, "operation": {
+                  "method_name": "query", "arguments": []}})
+                  for q in queries]
+        responses = post_pipelined(standin.url + 'map', bodies, timeout=10)
+        assert len(responses) == len(bodies), len(responses)
+        for i, (status, content) in enumerate(responses):
+            assert status == 200, status
+            results = json.loads(content)['results']
+            assert [v['label'] for v in results] == ['Label %d' % i], (
+                i, results)
+        assert standin.requests['map'] == len(bodies)
+    finally:
+        standin.stop()
+
+
+def check_closed_early():
+    def script(server, conn):
+        for i in range(3):
+            server.read_request()
+            reply(conn, 'ok %d' % i)
+    server = ScriptedServer(script)
+    responses = post_pipelined(server.url, ['{}'] * 10, timeout=10)
+    server.join()
+    assert responses == [(200, 'ok 0'), (200, 'ok 1'), (200, 'ok 2')], \
+        responses
+
+
+def check_batch_closed_early():
+    def script(server, conn):
+        for i in range(2):
+            server.read_request()
+            reply(conn, SUCCESS)
+    server = ScriptedServer(script)
+    lib = IOSLibrary(server.url.split('/')[2])
+    lib.set_basic_auth('user', 'secret')
+    lib.begin_gesture_batch()
+    for direction in ('left', 'right', 'up', 'down'):
+        lib.swipe(direction)
+    try:
+        lib.play_gesture_batch()
+    except IOSLibraryException as e:
+        message = str(e)
+    else:
+        raise AssertionError("missing responses not reported")
+    server.join()
+    no_response = "no response, the device closed the connection"
+    assert message == ("playback failed because: 3 swipe_up: %s; "
+                       "4 swipe_down: %s" % (no_response, no_response)), \
+        message
+    expected = 'Basic ' + base64.b64encode('user:secret')
+    assert server.requests[0][0]['authorization'] == expected
+
+
+def check_closed_at_once():
+    server = ScriptedServer(lambda server, conn: None)
+    try:
+        post_pipelined(server.url, ['{}'] * 3, timeout=10)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("no error without any response")
+    server.join()
+
+
+def check_basic_auth():
+    def script(server, conn):
+        for i in range(2):
+            server.read_request()
+            reply(conn, 'ok')
+    server = ScriptedServer(script)
+    post_pipelined(server.url, ['{"a": 1}', '{"b": 2}'],
+                   headers={'Content-Type': 'application/json'},
+                   timeout=10, auth=('user', 'sec:ret'))
+    server.join()
+    expected = 'Basic ' + base64.b64encode('user:sec:ret')
+    for headers, body in server.requests:
+        assert headers['authorization'] == expected, headers
+        assert headers['content-type'] == 'application/json', headers
+        assert headers['host'] == server.url.split('/')[2], headers
+    assert [b for h, b in server.requests] == ['{"a": 1}', '{"b": 2}']
+
+
+def check_early_answers():
+    # much more than the socket buffers hold: if the responses were only
+    # read after sending everything, client and server would block forever
+    count, size = 20, 512 * 1024
+
+    def script(server, conn):
+        for i in range(count):
+            reply(conn, 'early %d' % i)
+        while server.read_request():
+            pass
+    server = ScriptedServer(script)
+    responses = post_pipelined(server.url, ['x' * size] * count, timeout=10)
+    server.join()
+    assert responses == [(200, 'early %d' % i) for i in range(count)], \
+        responses[:3]
+    assert [len(b) for h, b in server.requests] == [size] * count
+
+
+CHECKS = (check_responses_in_order, check_closed_early,
+          check_batch_closed_early, check_closed_at_once, check_basic_auth,
+          check_early_answers)
+
+
+def main():
+    failures = []
+    for check in CHECKS:
+        try:
+            check()
+            print('%-30s ok' % check.__name__)
+        except Exception:
+            print('%-30s FAILED' % check.__name__)
+            traceback.print_exc()
+            failures.append(check.__name__)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Checks the device pool and the parallel runner against local stand-in
+servers::
+
+    python tests/pool/check_pool.py
+
+Covers leasing and releasing, overlapping pools, breaking the lock of a
+dead holder, skipping unhealthy endpoints and running suites with `IOSLibrary.runner.run`. Fails
+if any check does.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import traceback
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       '..', '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from IOSLibrary import runner
+from IOSLibrary.pool import LOCK_DIR, Device, DevicePool
+from IOSLibrary.standin import CalabashStandIn
+
+SUITE = """
+*** Settings ***
+Library     IOSLibrary
+
+*** Test Cases ***
+Query On The Leased Device %(index)d
+    Is Device Available
+    Query   view
+"""
+
+
+def free_endpoint():
+    """
+    Returns an endpoint nobody listens on.
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    endpoint = '127.0.0.1:%d' % sock.getsockname()[1]
+    sock.close()
+    return endpoint
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def check_lease_and_release(standins, lock_dir):
+    pool = DevicePool([Device(s.endpoint) for s in standins[:2]], lock_dir)
+    first = pool.lease(timeout=1)
+    second = pool.lease(timeout=1)
+    assert first.endpoint != second.endpoint, (first, second)
+    try:
+        pool.lease(timeout=0.2, poll_interval=0.1)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("leased a device twice")
+    pool.release(first)
+    assert pool.lease(timeout=1).endpoint == first.endpoint
+
+
+def check_overlapping_pools(standins, lock_dir):
+    host, port = standins[0].endpoint.split(':')
+    first = DevicePool([Device(s.endpoint) for s in standins[:2]])
+    # the same device spelled differently by another pool
+    second = DevicePool([Device('LOCALHOST:%s' % port),
+                         Device(standins[2].endpoint)])
+    assert first.lock_dir == second.lock_dir == LOCK_DIR, (
+        first.lock_dir, second.lock_dir)
+    leased = []
+    try:
+        leased.append((first, first.lease(timeout=1)))
+        leased.append((first, first.lease(timeout=1)))
+        leased.append((second, second.lease(timeout=1)))
+        assert leased[-1][1].endpoint == standins[2].endpoint, leased
+        try:
+            second.lease(timeout=0.2, poll_interval=0.1)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("device leased by two pools")
+        first.release(leased.pop(0)[1])
+        leased.append((second, second.lease(timeout=1)))
+    finally:
+        for pool, device in leased:
+            pool.release(device)
+
+
+def check_stale_lock(standins, lock_dir):
+    device = Device(standins[0].endpoint)
+    pool = DevicePool([device], lock_dir)
+    with open(pool._lock_path(device), 'w') as f:
+        f.write(str(dead_pid()))
+    assert pool.lease(timeout=0.5).endpoint == device.endpoint
+    with open(pool._lock_path(device)) as f:
+        assert f.read() == str(os.getpid())
+
+
+def check_unhealthy_endpoint(standins, lock_dir):
+    broken = Device(free_endpoint())
+    pool = DevicePool([broken, Device(standins[0].endpoint)], lock_dir)
+    assert pool.lease(timeout=1).endpoint == standins[0].endpoint
+    assert not os.path.exists(pool._lock_path(broken)), (
+        "lock of the unhealthy device kept")
+    pool = DevicePool([broken] + [Device(s.endpoint) for s in standins],
+                      tempfile.mkdtemp(dir=lock_dir))
+    leased = pool.lease_healthy()
+    assert sorted(d.endpoint for d in leased) == sorted(
+        s.endpoint for s in standins), leased
+
+
+def check_runner(standins, lock_dir):
+    from robot.api import ExecutionResult
+
+    suites_dir = tempfile.mkdtemp(dir=lock_dir)
+    suites = []
+    for index in range(4):
+        path = os.path.join(suites_dir, 'suite%d.txt' % index)
+        with open(path, 'w') as f:
+            f.write(SUITE % {'index': index})
+        suites.append(path)
+    before = sum(s.requests.get('map', 0) for s in standins)
+    pool = DevicePool([Device(s.endpoint) for s in standins],
+                      tempfile.mkdtemp(dir=lock_dir))
+    outputdir = os.path.join(lock_dir, 'results')
+    rc = runner.run(suites, pool, outputdir, ['--pythonpath', SRC_DIR],
+                    name='Pool')
+    assert rc == 0, "%d failed tests, see %s" % (rc, outputdir)
+    result = ExecutionResult(os.path.join(outputdir, 'output.xml'))
+    stats = result.statistics.total.critical
+    assert (stats.passed, stats.failed) == (4, 0), (stats.passed,
+                                                    stats.failed)
+    assert result.suite.name == 'Pool', result.suite.name
+    assert sum(s.requests.get('map', 0) for s in standins) - before == 4
+    assert not os.listdir(pool.lock_dir), "devices not released"
+
+
+CHECKS = (check_lease_and_release, check_overlapping_pools, check_stale_lock,
+          check_unhealthy_endpoint, check_runner)
+
+
+def main():
+    standins = [CalabashStandIn().start() for i in range(3)]
+    failures = []
+    try:
+        for check in CHECKS:
+            lock_dir = tempfile.mkdtemp(prefix='ioslibrary-pool-check-')
+            try:
+                check(standins, lock_dir)
+                print('%-30s ok' % check.__name__)
+            except Exception:
+                print('%-30s FAILED' % check.__name__)
+                traceback.print_exc()
+                failures.append(check.__name__)
+            finally:
+                shutil.rmtree(lock_dir, ignore_errors=True)
+    finally:
+        for standin in standins:
+            standin.stop()
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
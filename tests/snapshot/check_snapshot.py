@@ -0,0 +1,134 @@
+"""
+Checks the queries answered by `IOSLibrary.snapshot.Snapshot`::
+
+    python tests/snapshot/check_snapshot.py
+
+Covers the supported subset of the Calabash query syntax on a fixed set of
+views, and the queries which have to raise `UnsupportedQuery` so that the
+test server answers them instead. Fails if any check does.
+"""
+import os
+import sys
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from IOSLibrary.snapshot import Snapshot, UnsupportedQuery, parse_query
+
+VIEWS = [
+    {"class": "UILabel", "label": "Title", "text": "Welcome"},
+    {"class": "UIButton", "label": "Sign in", "id": "login"},
+    {"class": "UILabel", "label": "Hint", "text": "Don't panic"},
+    {"class": "UITextField", "label": None, "id": "user", "text": "Arthur"},
+    {"class": "UIButton", "label": "Help", "id": "help"},
+    {"class": "MKMapView", "label": "Map"},
+    {"class": "UILabel", "label": "It's 100% *real*", "text": "Wildcards?"},
+    "not a view",
+]
+
+SNAPSHOT = Snapshot(VIEWS)
+
+
+def find(query):
+    return SNAPSHOT.find(query)
+
+
+def check_classes():
+    assert find("view") == range(7), find("view")
+    assert find("label") == [0, 2, 6], find("label")
+    assert find("button") == [1, 4], find("button")
+    assert find("textField") == [3], find("textField")
+    assert find("view:'MKMapView'") == [5], find("view:'MKMapView'")
+    assert find("switch") == [], find("switch")
+
+
+def check_marked():
+    # by accessibility label
+    assert find("view marked:'Sign in'") == [1]
+    assert find("button marked:'Help'") == [4]
+    assert find("label marked:'Help'") == []
+    # by accessibility identifier
+    assert find("view marked:'login'") == [1]
+    assert find("textField marked:'user'") == [3]
+    assert find("marked:'user'") == [3]
+    assert find("view marked:'Welcome'") == [], "marked matched a text"
+
+
+def check_index_after_filters():
+    assert find("label index:1") == [2], find("label index:1")
+    assert find("button index:1") == [4], find("button index:1")
+    assert find("button index:2") == [], find("button index:2")
+    assert find("view marked:'Help' index:0") == [4]
+    assert find("view {text LIKE '*a*'} index:1") == [6], find(
+        "view {text LIKE '*a*'} index:1")
+    assert find("index:3") == [3], find("index:3")
+
+
+def check_escaped_quotes():
+    assert find(r"view marked:'It\'s 100% *real*'") == [6]
+    assert find(r"view {text LIKE 'Don\'t panic'}") == [2]
+    assert find(r"view {text LIKE 'Don\'t*'}") == [2]
+    assert find(r"view {label LIKE '*\'s*'}") == [6]
+
+
+def check_like():
+    assert find("view {text LIKE 'Welcome'}") == [0]
+    assert find("view {text LIKE 'welcome'}") == [], "LIKE ignored case"
+    assert find("view {text LIKE 'W*'}") == [0, 6]
+    assert find("view {text LIKE '*r*'}") == [3, 6]
+    assert find("view {text LIKE 'Arth?r'}") == [3]
+    assert find("view {text LIKE 'Arth?'}") == []
+    assert find("label {label LIKE 'H*'}") == [2]
+    # only * and ? are wildcards, regular expression characters are not
+    assert find("view {text LIKE 'Wildcards?'}") == [6]
+    assert find("view {label LIKE '* 100% ?real?'}") == [6]
+    assert find("view {label LIKE '.*'}") == []
+    # several predicates all have to match
+    assert find("view {text LIKE 'W*'} {label LIKE 'T*'}") == [0]
+
+
+def check_unsupported():
+    for query in ("view descendant label",
+                  "view label",
+                  "button marked:'Help' label",
+                  "webView css:'body'",
+                  "css:'a'",
+                  "label first",
+                  "first",
+                  "view {text BEGINSWITH 'W'}",
+                  "view {tag LIKE '1'}",
+                  "view isEnabled:1",
+                  "view {text LIKE 'A' OR text LIKE 'B'}",
+                  "view index:0 marked:'Help'",
+                  "view index:0 index:1",
+                  "view marked:'Help' marked:'Map'",
+                  "view marked:'unterminated"):
+        try:
+            parse_query(query)
+        except UnsupportedQuery:
+            continue
+        raise AssertionError("%r was not refused" % query)
+
+
+CHECKS = (check_classes, check_marked, check_index_after_filters,
+          check_escaped_quotes, check_like, check_unsupported)
+
+
+def main():
+    failures = []
+    for check in CHECKS:
+        try:
+            check()
+            print('%-30s ok' % check.__name__)
+        except Exception:
+            print('%-30s FAILED' % check.__name__)
+            traceback.print_exc()
+            failures.append(check.__name__)
+    if failures:
+        sys.stderr.write('FAILED %s\n' % ', '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()